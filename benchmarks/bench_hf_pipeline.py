@@ -0,0 +1,244 @@
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import statistics
+import tracemalloc
+
+from benchmarks.mock_servers import LatencyModel, MockHFConfig, MockLLMConfig, mock_hf_server, mock_llm_server
+from src.utils.hf_client import AsyncHFClient
+from src.utils.llm_client import LLMClient, get_llm_client, set_llm_client
+from src.utils.metrics import Metrics, get_metrics, set_metrics
+from src.utils.speculation import SpeculationPolicy
+from src.huggingface.hf_pipeline import hf_data_crawl, hf_data_process
+from src.huggingface.hf_budget import hf_data_budgeted
+from src.utils.budget import SpendBudget
+
+from configs.hf_config import TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT
+
+# 相对基线允许的退化幅度，超过则返回非零退出码
+GATED_METRICS = {"rows_per_sec": "higher", "row_p99": "lower", "peak_rss_mb": "lower"}
+
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_once(args, llm_url, hf_url):
+    """
+    One end-to-end pass: hf_data_crawl followed by hf_data_process against the mock servers.
+    """
+    set_metrics(Metrics())
+    set_llm_client(LLMClient(
+        api_key="bench",
+        base_url=f"{llm_url}/v1",
+        max_concurrency=args.llm_concurrency,
+        adaptive_concurrency=args.adaptive,
+        structured_output=args.structured,
+        hedge=args.hedge
+    ))
+    client = AsyncHFClient(
+        hf_token="bench",
+        max_concurrency_per_host=args.hf_concurrency,
+        endpoint=hf_url,
+        base_url=hf_url,
+        hedge=args.hedge
+    )
+    if args.trace_malloc:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    error = None
+    rows_in = rows_out = 0
+    try:
+        row_sampling = None if args.row_sampling is None else {"mode": args.row_sampling, "prefetch": args.prefetch}
+        speculation = SpeculationPolicy(args.speculate) if args.speculate else None
+        if args.target_accepted:
+            # 预算模式下抓取与处理交织进行，整段计入 process_sec
+            crawl_done = start
+
+            async def discard(item):
+                pass
+
+            stats = await hf_data_budgeted(
+                TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT, client, discard, args.target_accepted,
+                budget=SpendBudget(max_calls=args.max_calls),
+                task_datasets_count=args.datasets,
+                row_sampling=row_sampling,
+                concurrency=args.budget_concurrency,
+                speculation=speculation
+            )
+            rows_in, rows_out = stats["rows"], stats["accepted"]
+        else:
+            dataset_map = await hf_data_crawl(TASK_DESCRIPTION, client, args.datasets, args.samples, row_sampling)
+            crawl_done = time.perf_counter()
+            rows_in = sum(len(dataset["rows"]) for datasets in dataset_map.values() for dataset in datasets)
+            processed = await hf_data_process(dataset_map, TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT, speculation)
+            rows_out = sum(len(dataset["samples"]) for datasets in processed.values() for dataset in datasets)
+    except Exception as e:
+        # 注入错误时整批可能失败，记录下来而不是中断整个基准
+        logging.exception("Benchmark run failed")
+        error = repr(e)
+        crawl_done = crawl_done if "crawl_done" in locals() else time.perf_counter()
+    end = time.perf_counter()
+    await client.aclose()
+
+    metrics = get_metrics()
+    row_latency = metrics.histograms.get("sample")
+    llm_latency = metrics.histograms.get("llm.chat_complete")
+    result = {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "crawl_sec": round(crawl_done - start, 3),
+        "process_sec": round(end - crawl_done, 3),
+        "total_sec": round(end - start, 3),
+        "rows_per_sec": round(rows_in / (end - start), 2) if rows_in and error is None else 0.0,
+        "row_p50": round(row_latency.percentile(0.5), 3) if row_latency else None,
+        "row_p99": round(row_latency.percentile(0.99), 3) if row_latency else None,
+        "llm_p50": round(llm_latency.percentile(0.5), 3) if llm_latency else None,
+        "llm_p99": round(llm_latency.percentile(0.99), 3) if llm_latency else None,
+        "llm_requests": int(metrics.counters.get("llm.requests", 0)),
+        "accepted_per_call": round(rows_out / metrics.counters["llm.requests"], 3) if metrics.counters.get("llm.requests") else None,
+        "llm_retries": int(metrics.counters.get("llm.retries", 0)),
+        "llm_hedges": int(metrics.counters.get("llm.hedges", 0)),
+        "failed_rows": int(metrics.counters.get("sample.failed", 0)),
+        "speculation_wasted": int(metrics.counters.get("speculation.wasted", 0)),
+        "llm_concurrency_limit": get_llm_client().concurrency.stats()["limit"],
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "error": error,
+    }
+    if args.trace_malloc:
+        result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    return result
+
+
+def summarize(runs):
+    """
+    Median of each numeric field across runs.
+    """
+    summary = {}
+    for key, value in runs[0].items():
+        values = [run[key] for run in runs if isinstance(run.get(key), (int, float))]
+        if values and isinstance(value, (int, float)):
+            summary[key] = round(statistics.median(values), 3)
+    summary["failed_runs"] = sum(1 for run in runs if run["error"])
+    return summary
+
+
+def compare(summary, baseline, tolerance):
+    """
+    Return human-readable regressions of `summary` against `baseline` beyond `tolerance` (a fraction).
+    """
+    regressions = []
+    for key, direction in GATED_METRICS.items():
+        old, new = baseline.get(key), summary.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (direction == "higher" and change < -tolerance) or (direction == "lower" and change > tolerance):
+            regressions.append(f"{key}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark of hf_data_crawl + hf_data_process against local mock servers.")
+    parser.add_argument("--keywords", type=int, default=4, help="Keywords returned by the mock keyword extraction.")
+    parser.add_argument("--datasets", type=int, default=5, help="Datasets per keyword.")
+    parser.add_argument("--samples", type=int, default=20, help="Rows taken per dataset.")
+    parser.add_argument("--shared-datasets", type=int, default=0, help="Datasets returned by every keyword search.")
+    parser.add_argument("--rows-per-dataset", type=int, default=100, help="Synthetic rows in each mock dataset.")
+    parser.add_argument("--row-sampling", choices=["head", "random", "stratified"], help="Read rows through /rows with this sampling mode instead of first-rows.")
+    parser.add_argument("--prefetch", type=int, default=4, help="Concurrent /rows pages per dataset with --row-sampling.")
+    parser.add_argument("--unmapped-rate", type=float, default=0.0, help="Share of datasets whose columns need LLM field mapping.")
+    parser.add_argument("--accept-rate", type=float, default=0.7, help="Share of samples the mock judge keeps.")
+    parser.add_argument("--accept-spread", type=float, default=0.0, help="Spread of per-dataset acceptance rates around --accept-rate.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Median LLM latency in seconds.")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="Log-normal spread of LLM latency.")
+    parser.add_argument("--llm-per-token", type=float, default=0.0, help="Extra LLM latency per completion token.")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0)
+    parser.add_argument("--llm-capacity", type=int, help="Concurrent LLM requests the mock serves before answering 429.")
+    parser.add_argument("--hf-latency", type=float, default=0.05, help="Median datasets-server latency in seconds.")
+    parser.add_argument("--hf-sigma", type=float, default=0.5)
+    parser.add_argument("--hf-error-rate", type=float, default=0.0)
+    parser.add_argument("--hf-429-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with mock 429s.")
+    parser.add_argument("--llm-concurrency", type=int, default=16, help="LLM concurrency (the ceiling with --adaptive).")
+    parser.add_argument("--adaptive", action="store_true", help="Let the LLM client adapt its concurrency (AIMD).")
+    parser.add_argument("--hf-concurrency", type=int, default=8)
+    parser.add_argument("--hedge", action="store_true", help="Hedge LLM and datasets-server calls slower than their p95.")
+    parser.add_argument("--speculate", choices=["adaptive", "always"], help="Start format conversion alongside the judge.")
+    parser.add_argument("--target-accepted", type=int, help="Run hf_data_budgeted until this many samples are accepted instead of crawl + process.")
+    parser.add_argument("--max-calls", type=int, help="LLM call budget with --target-accepted.")
+    parser.add_argument("--budget-concurrency", type=int, default=16, help="Rows in flight with --target-accepted.")
+    parser.add_argument("--structured", action="store_true", help="Use structured streaming output with early termination.")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of runs; the summary reports medians.")
+    parser.add_argument("--trace-malloc", action="store_true", help="Also report the traced Python heap peak (slows the run).")
+    parser.add_argument("--output", help="Write runs and summary as JSON to this path.")
+    parser.add_argument("--baseline", help="Summary JSON of an earlier run; exit non-zero on regression.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative regression against the baseline.")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+        datefmt="%H:%M:%S"
+    )
+
+    llm_config = MockLLMConfig(
+        latency=LatencyModel(args.llm_latency, args.llm_sigma, args.llm_per_token),
+        error_rate=args.llm_error_rate,
+        rate_limit_rate=args.llm_429_rate,
+        retry_after=args.retry_after,
+        capacity=args.llm_capacity,
+        keywords=args.keywords,
+        accept_rate=args.accept_rate,
+        accept_spread=args.accept_spread
+    )
+    hf_config = MockHFConfig(
+        latency=LatencyModel(args.hf_latency, args.hf_sigma),
+        error_rate=args.hf_error_rate,
+        rate_limit_rate=args.hf_429_rate,
+        retry_after=args.retry_after,
+        datasets_per_search=args.datasets,
+        shared_datasets=args.shared_datasets,
+        rows_per_dataset=args.rows_per_dataset,
+        unmapped_rate=args.unmapped_rate
+    )
+
+    runs = []
+    with mock_llm_server(llm_config) as llm, mock_hf_server(hf_config) as hf:
+        for i in range(args.repeat):
+            result = asyncio.run(run_once(args, llm.url, hf.url))
+            runs.append(result)
+            print(f"run {i + 1}/{args.repeat}: {json.dumps(result)}")
+        server_stats = {"llm": llm.stats(), "hf": hf.stats()}
+
+    summary = summarize(runs)
+    print(f"summary: {json.dumps(summary)}")
+    print(f"servers: {json.dumps(server_stats)}")
+    print(get_metrics().summary_table())
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "runs": runs, "summary": summary, "servers": server_stats}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline.get("summary", baseline), args.tolerance)
+        if regressions:
+            print("REGRESSION:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
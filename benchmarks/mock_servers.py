@@ -0,0 +1,383 @@
+import re
+import json
+import math
+import time
+import zlib
+import random
+import threading
+import multiprocessing
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+
+@dataclass
+class LatencyModel:
+    """
+    Log-normal service time: `median` seconds, spread by `sigma` (0 gives a constant delay).
+    `per_token` adds a decode cost per completion token for LLM replies.
+    """
+
+    median: float = 0.05
+    sigma: float = 0.5
+    per_token: float = 0.0
+
+    def sample(self, rng: random.Random, tokens: int = 0) -> float:
+        base = self.median * math.exp(self.sigma * rng.gauss(0, 1)) if self.sigma else self.median
+        return base + self.per_token * tokens
+
+
+@dataclass
+class MockLLMConfig:
+    """
+    Behaviour of the mock OpenAI-compatible chat completions server.
+    `accept_rate` is the share of samples the mock judge scores high enough to keep.
+    Requests beyond `capacity` concurrent ones are answered with 429 like an overloaded provider.
+    Bulk generation draws samples from `synthetic_pool` distinct ones, so a small pool yields duplicates.
+    With `accept_spread`, each mock dataset's acceptance rate is shifted by up to ±accept_spread (stable per id).
+    """
+
+    latency: LatencyModel = field(default_factory=lambda: LatencyModel(0.2, 0.5, 0.0))
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    capacity: Optional[int] = None
+    keywords: int = 4
+    accept_rate: float = 0.7
+    accept_spread: float = 0.0
+    stream_chunk_chars: int = 16
+    stream_tail_chars: int = 0
+    synthetic_pool: int = 1000000
+    seed: int = 0
+
+
+@dataclass
+class MockHFConfig:
+    """
+    Behaviour and synthetic data of the mock Hub search API and datasets-server.
+    `unmapped_rate` is the share of datasets whose column names defeat the field-mapping heuristics.
+    The first `shared_datasets` results of every search are the same datasets, as with overlapping keywords.
+    """
+
+    latency: LatencyModel = field(default_factory=lambda: LatencyModel(0.05, 0.5, 0.0))
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    capacity: Optional[int] = None
+    datasets_per_search: int = 5
+    shared_datasets: int = 0
+    rows_per_dataset: int = 100
+    first_rows: int = 100
+    unmapped_rate: float = 0.0
+    seed: int = 0
+
+
+def _stable_fraction(text: str) -> float:
+    return (zlib.crc32(text.encode("utf-8")) % 10000) / 10000
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on this request
+            pass
+
+    def _inject_failure(self) -> bool:
+        # 超出容量或按配置的概率返回 429 / 500
+        config = self.server.config
+        roll = self.server.rng.random()
+        overloaded = config.capacity is not None and self.server.snapshot()["in_flight"] > config.capacity
+        if overloaded or roll < config.rate_limit_rate:
+            self.server.count("rate_limited")
+            self._send_json(429, {"error": {"message": "rate limited"}}, {"Retry-After": f"{config.retry_after:g}"})
+            return True
+        if roll < config.rate_limit_rate + config.error_rate:
+            self.server.count("errors")
+            self._send_json(500, {"error": {"message": "internal error"}})
+            return True
+        return False
+
+    def _serve_stats(self) -> bool:
+        if urlparse(self.path).path != "/_stats":
+            return False
+        self._send_json(200, self.server.snapshot())
+        return True
+
+
+class _MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The socketserver default backlog of 5 stalls bursts of new connections on SYN retries
+    request_queue_size = 1024
+
+    def __init__(self, handler, config):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "in_flight": 0, "max_in_flight": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.stats[name] += value
+            if name == "in_flight":
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
+
+
+class MockLLMHandler(_MockHandler):
+    """
+    Answers the pipeline's prompts (keywords, field mapping, single/batch judge, single/batch conversion)
+    with well-formed replies, after a sampled delay. Supports streamed (SSE) responses.
+    """
+
+    def do_GET(self):
+        if not self._serve_stats():
+            self._send_json(404, {})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.count("requests")
+        self.server.count("in_flight")
+        try:
+            if self._inject_failure():
+                return
+            prompt = body["messages"][-1]["content"]
+            content = self.reply(prompt)
+            config = self.server.config
+            prompt_tokens = len(prompt) // 4
+            completion_tokens = len(content) // 4
+            delay = config.latency.sample(self.server.rng, completion_tokens)
+            if body.get("stream"):
+                self._stream(body["model"], content + " " * config.stream_tail_chars, delay)
+                return
+            time.sleep(delay)
+            self._send_json(200, {
+                "id": "mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            })
+        finally:
+            self.server.count("in_flight", -1)
+
+    def _stream(self, model: str, content: str, delay: float):
+        step = self.server.config.stream_chunk_chars
+        chunks = [content[i:i + step] for i in range(0, len(content), step)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                time.sleep(delay / len(chunks))
+                event = json.dumps({
+                    "id": "mock",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+                })
+                self._write_chunk(f"data: {event}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stops reading once the JSON value is complete
+            pass
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _scores(self, sample_text: str) -> Dict[str, int]:
+        config = self.server.config
+        accept_rate = config.accept_rate
+        match = re.search(r"\[([\w/.-]+)\] Problem", sample_text)
+        if config.accept_spread and match:
+            accept_rate += config.accept_spread * (2 * _stable_fraction(match.group(1) + "#rate") - 1)
+        score = 9 if _stable_fraction(sample_text) < accept_rate else 5
+        return {"Relevance": score, "Correctness": score, "Helpfulness": score, "Clarity": score, "Difficulty": score}
+
+    def reply(self, prompt: str) -> str:
+        config = self.server.config
+        if prompt.rstrip().endswith("KEYWORDS:"):
+            return json.dumps([f"topic {i}" for i in range(config.keywords)])
+        if "data field identifier" in prompt:
+            if "body_text" in prompt:
+                return json.dumps({"input": "body_text", "output": "label_text"})
+            return json.dumps({"input": "question", "output": "answer"})
+        samples = re.split(r"### Sample \d+\n", prompt)[1:]
+        if "Instruction Samples:" in prompt:
+            return json.dumps([dict(id=i, **self._scores(sample)) for i, sample in enumerate(samples)])
+        if "Return your evaluation in strict" in prompt:
+            return json.dumps(self._scores(prompt))
+        if "format conversion assistant" in prompt and samples:
+            return json.dumps([{"id": i, "input": f"Q: converted {i}", "output": "<think>...</think> <answer>A</answer>"} for i in range(len(samples))])
+        if "format conversion assistant" in prompt:
+            return json.dumps({"input": "Q: converted", "output": "<think>...</think> <answer>A</answer>"})
+        match = re.search(r"Generate \*\*(\d+)\*\* distinct", prompt)
+        if match:
+            picks = [self.server.rng.randrange(config.synthetic_pool) for _ in range(int(match.group(1)))]
+            return json.dumps([{"input": f"Q: synthetic problem {n}: what is {n} + {n % 97}?", "output": f"<think>{n} + {n % 97}</think> <answer>{n + n % 97}</answer>"} for n in picks])
+        return json.dumps({"input": "generated input", "output": "generated output"})
+
+
+class MockHFHandler(_MockHandler):
+    """
+    Serves the Hub dataset search API (/api/datasets) and the datasets-server endpoints
+    (/info, /splits, /first-rows, /rows) over synthetic datasets of configurable size.
+    """
+
+    def do_GET(self):
+        if self._serve_stats():
+            return
+        self.server.count("requests")
+        self.server.count("in_flight")
+        try:
+            time.sleep(self.server.config.latency.sample(self.server.rng))
+            if self._inject_failure():
+                return
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, body = self.route(url.path, params)
+            self._send_json(status, body)
+        finally:
+            self.server.count("in_flight", -1)
+
+    def _columns(self, dataset: str) -> Tuple[str, str]:
+        if _stable_fraction(dataset) < self.server.config.unmapped_rate:
+            return "body_text", "label_text"
+        return "question", "answer"
+
+    def _row(self, dataset: str, idx: int) -> Dict[str, Any]:
+        input_key, output_key = self._columns(dataset)
+        a, b = idx % 97 + 3, (idx * 7) % 89 + 5
+        return {
+            input_key: f"[{dataset}] Problem {idx}: a shop sells {a} apples in the morning and {b} in the afternoon. How many apples did it sell in total?",
+            output_key: f"It sold {a} + {b} = {a + b} apples.",
+        }
+
+    def _rows(self, dataset: str, offset: int, length: int) -> Dict[str, Any]:
+        total = self.server.config.rows_per_dataset
+        input_key, output_key = self._columns(dataset)
+        return {
+            "features": [
+                {"feature_idx": 0, "name": input_key, "type": {"dtype": "string", "_type": "Value"}},
+                {"feature_idx": 1, "name": output_key, "type": {"dtype": "string", "_type": "Value"}},
+            ],
+            "rows": [
+                {"row_idx": idx, "row": self._row(dataset, idx), "truncated_cells": []}
+                for idx in range(offset, min(offset + length, total))
+            ],
+            "num_rows_total": total,
+            "num_rows_per_page": length,
+        }
+
+    def route(self, path: str, params: Dict[str, str]) -> Tuple[int, Any]:
+        config = self.server.config
+        dataset = params.get("dataset", "")
+        if path == "/api/datasets":
+            slug = re.sub(r"\W+", "-", params.get("search", "")).strip("-") or "any"
+            count = min(config.datasets_per_search, int(params.get("limit", config.datasets_per_search)))
+            return 200, [
+                {
+                    "id": f"bench/shared-{i}" if i < config.shared_datasets else f"bench/{slug}-{i}",
+                    "downloads": 1000 - i,
+                    "likes": 0,
+                    "private": False,
+                    "tags": ["format:json"],
+                }
+                for i in range(count)
+            ]
+        if path == "/info":
+            input_key, output_key = self._columns(dataset)
+            features = {input_key: {"dtype": "string", "_type": "Value"}, output_key: {"dtype": "string", "_type": "Value"}}
+            return 200, {"dataset_info": {"default": {
+                "features": features,
+                "splits": {"train": {"name": "train", "num_examples": config.rows_per_dataset}},
+            }}}
+        if path == "/splits":
+            return 200, {"splits": [{"dataset": dataset, "config": "default", "split": "train"}]}
+        if path == "/first-rows":
+            return 200, self._rows(dataset, 0, min(config.first_rows, config.rows_per_dataset))
+        if path == "/rows":
+            return 200, self._rows(dataset, int(params.get("offset", 0)), min(int(params.get("length", 100)), 100))
+        return 404, {"error": f"unknown path {path}"}
+
+
+def _serve(handler, config, conn):
+    server = _MockServer(handler, config)
+    conn.send(server.server_address[1])
+    conn.close()
+    server.serve_forever()
+
+
+class MockServer:
+    """
+    Runs a mock server in a child process so its request handling doesn't compete with the
+    benchmarked client for the GIL. Use as a context manager; `url` is set once started.
+    """
+
+    def __init__(self, handler, config):
+        self.handler = handler
+        self.config = config
+        self.url: Optional[str] = None
+        self._process = None
+
+    def start(self) -> str:
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        self._process = context.Process(target=_serve, args=(self.handler, self.config, child_conn), daemon=True)
+        self._process.start()
+        port = parent_conn.recv()
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    def stats(self) -> Dict[str, int]:
+        return requests.get(f"{self.url}/_stats", timeout=5).json()
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def mock_llm_server(config: Optional[MockLLMConfig] = None) -> MockServer:
+    return MockServer(MockLLMHandler, config or MockLLMConfig())
+
+
+def mock_hf_server(config: Optional[MockHFConfig] = None) -> MockServer:
+    return MockServer(MockHFHandler, config or MockHFConfig())
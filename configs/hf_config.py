@@ -1,7 +1,73 @@
 LLM_API_KEY = "sk-"
 LLM_BASE_URL = "https://api.deepseek.com"
 LLM_MODEL = "deepseek-chat"
+LLM_MAX_CONCURRENCY = 64  # ceiling when LLM_ADAPTIVE_CONCURRENCY is on
+LLM_ADAPTIVE_CONCURRENCY = True
+LLM_MIN_CONCURRENCY = 2
+LLM_RPM = None
+LLM_TPM = None
+LLM_CACHE_PATH = "hf_logs/llm_cache.sqlite"
+LLM_CACHE_TTL = None
+LLM_CACHE_READ_ONLY = False
+LLM_STRUCTURED_OUTPUT = True
+LLM_JSON_MODE = True
+LLM_RETRY = {"max_attempts": 4, "base_delay": 1.0, "max_delay": 30.0, "deadline": 600}
+LLM_HEDGE = False  # duplicate calls slower than p95; costs extra tokens
 HUGGINGFACE_TOKEN = "hf_"
+HF_MAX_CONCURRENCY_PER_HOST = 8
+HF_RPM_PER_HOST = None
+HF_CACHE_PATH = "hf_logs/hf_cache.sqlite"
+HF_CACHE_OFFLINE = False
+HF_RETRY = {"max_attempts": 4, "base_delay": 0.5, "max_delay": 10.0, "deadline": 120}
+HF_HEDGE = True
+
+TASK_DATASETS_COUNT = 5
+TASK_DATA_SAMPLES = 5
+# None takes the first rows; e.g. {"mode": "random", "seed": 0, "prefetch": 4} streams a sample via /rows,
+# add "source": "parquet" to read the converted Parquet files instead (needs pyarrow)
+ROW_SAMPLING = None
+# BM25 pre-ranking of candidates by README / info / tags; top_k and min_score (relative to the best) cut the list
+DATASET_RANKING = {"top_k": 10, "min_score": 0.2, "readme": True}
+PIPELINE_WORKERS = {"fields": 4, "prefilter": 64, "judge": 16, "convert": 16}
+PIPELINE_QUEUE_SIZE = 64
+JUDGE_BATCH_SIZE = 8
+CONVERT_BATCH_SIZE = 4
+BATCH_TOKEN_BUDGET = 6000
+JOURNAL_PATH = "hf_logs/hf_journal.jsonl"
+RESULT_DIR = "hf_logs/results"
+RESULT_FORMATS = ["jsonl"]  # add "parquet" when pyarrow is installed
+RESULT_SHARD_SIZE = 10000
+RESULT_COMPRESSION = None
+DEDUP_ENABLED = True
+DEDUP_INDEX_PATH = "hf_logs/dedup_index.sqlite"  # cleared with the result shards at the start of a run, kept with --resume
+DEDUP_THRESHOLD = 0.85
+METRICS_TRACE = False  # record spans for chrome://tracing / Perfetto
+METRICS_TRACE_PATH = "hf_logs/trace.json"
+# Start format conversion alongside the judge when latency matters more than tokens; None to disable.
+# "adaptive" speculates on a share of rows that grows with the acceptance rate (none below low, all above high)
+SPECULATION = None  # e.g. {"mode": "adaptive", "low": 0.2, "high": 0.6}
+BATCH_OUTPUT_DIR = "hf_logs/batch"  # one sub-directory per manifest task
+BATCH_MAX_CONCURRENT_TASKS = 4
+BUDGET_TARGET_ACCEPTED = 1000  # accepted samples wanted by tests/test_hf_pipeline.py --budgeted
+BUDGET_MAX_ROWS_PER_DATASET = 500
+BUDGET = {"max_calls": 5000, "max_tokens": None, "max_cost": None, "price_per_1k_prompt": 0.0, "price_per_1k_completion": 0.0}
+GENERATE_TARGET = 1000  # synthetic samples written by tests/test_hf_generate.py
+GENERATE_RESULT_DIR = "hf_logs/synthetic"
+GENERATE_SETTINGS = {"samples_per_call": 10, "concurrency": 8, "examples_per_call": 3, "temperature": 1.0, "judge": True}
+JUDGE_LOG_PATH = "hf_logs/judge_log.jsonl"  # every LLM judge verdict, appended across runs; None to disable
+SURROGATE_ENABLED = True  # takes effect once tests/test_hf_surrogate.py has trained a model for the task
+SURROGATE_SETTINGS = {"model_dir": "hf_logs/surrogate", "explore": 0.05}
+SURROGATE_TRAINING = {"epochs": 3, "validation": 0.2, "max_loss": 0.02, "min_examples": 200}
+PREFILTER_ENABLED = True
+PREFILTER_SETTINGS = {
+    "min_input": 10,
+    "max_input": 8000,
+    "min_output": 1,
+    "max_output": 16000,
+    # No script filter by default: tasks are not all English. To keep only some writing systems,
+    # list them, e.g. ["latin"] or ["latin", "cjk"] (see dominant_script in src/huggingface/prefilter.py)
+    "languages": None,
+}
 
 TASK_DESCRIPTION = "You are given a word problem involving basic arithmetic, algebra, or geometry. Your task is to carefully read the problem and provide a step-by-step solution for it."
 
@@ -0,0 +1,41 @@
+from typing import Any, Dict, Iterable, Iterator, List
+
+
+class CandidatePool:
+    """
+    Datasets found by the keyword searches, deduplicated by id in order of discovery.
+    Each candidate remembers every keyword whose search returned it, so it is fetched and processed once.
+    """
+
+    def __init__(self):
+        self.candidates: Dict[str, Dict[str, Any]] = {}
+        self.duplicates = 0
+
+    def add(self, keyword: str, datasets: Iterable[Any]) -> List[str]:
+        """
+        Merge one keyword's search results; returns the ids that were not in the pool yet.
+        """
+        added = []
+        for dataset in datasets:
+            dataset_id = dataset.id
+            candidate = self.candidates.get(dataset_id)
+            if candidate is None:
+                self.candidates[dataset_id] = {"id": dataset_id, "keywords": [keyword], "search_info": dataset}
+                added.append(dataset_id)
+                continue
+            self.duplicates += 1
+            if keyword not in candidate["keywords"]:
+                candidate["keywords"].append(keyword)
+        return added
+
+    def keywords(self, dataset_id: str) -> List[str]:
+        return self.candidates[dataset_id]["keywords"]
+
+    def primary_keyword(self, dataset_id: str) -> str:
+        return self.candidates[dataset_id]["keywords"][0]
+
+    def __len__(self) -> int:
+        return len(self.candidates)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.candidates)
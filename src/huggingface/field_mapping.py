@@ -0,0 +1,98 @@
+import json
+import asyncio
+import hashlib
+from typing import Optional, Dict, Any, Iterable
+
+from .hf_crawl import field_filter, field_filter_payload
+
+# Common (input, output) column pairs, in priority order
+HEURISTIC_FIELD_PAIRS = [
+    ("question", "answer"),
+    ("instruction", "output"),
+    ("prompt", "completion"),
+    ("prompt", "response"),
+    ("input", "output"),
+    ("query", "response"),
+    ("problem", "solution"),
+    ("question", "solution"),
+    ("problem", "answer"),
+    ("instruction", "response"),
+    ("query", "answer"),
+]
+
+
+def feature_types(dataset_info: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Flatten the per-config features of a datasets-server `/info` response into {column: type}.
+    """
+    types = {}
+    if not dataset_info:
+        return types
+    for config_info in dataset_info.get("dataset_info", {}).values():
+        for name, feature in (config_info.get("features") or {}).items():
+            if isinstance(feature, dict):
+                types.setdefault(name, feature.get("dtype") or feature.get("_type") or "unknown")
+            else:
+                types.setdefault(name, type(feature).__name__)
+    return types
+
+
+def schema_fingerprint(keys: Iterable[str], dataset_info: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Stable hash of a row schema: its sorted keys plus their feature types when known.
+    """
+    types = feature_types(dataset_info)
+    schema = [(key, types.get(key, "unknown")) for key in sorted(keys)]
+    return hashlib.sha1(json.dumps(schema).encode("utf-8")).hexdigest()
+
+
+def heuristic_field_mapping(keys: Iterable[str]) -> Optional[Dict[str, str]]:
+    """
+    Match common column names (question/answer, instruction/output, ...) without an LLM call.
+    """
+    lowered = {key.lower(): key for key in keys}
+    for input_key, output_key in HEURISTIC_FIELD_PAIRS:
+        if input_key in lowered and output_key in lowered:
+            return {"input": lowered[input_key], "output": lowered[output_key]}
+    return None
+
+
+class FieldMapper:
+    """
+    Resolves the input/output field mapping once per dataset schema.
+    Rows sharing a schema fingerprint reuse the first result; concurrent rows wait for it
+    instead of issuing their own `field_filter` call.
+    """
+
+    def __init__(self, use_heuristics: bool = True):
+        self.use_heuristics = use_heuristics
+        self._mappings: Dict[str, asyncio.Future] = {}
+        self.heuristic_hits = 0
+        self.llm_calls = 0
+
+    async def resolve(self, row_data: Dict[str, Any], dataset_info: Optional[Dict[str, Any]] = None) -> Dict[str, Optional[str]]:
+        fingerprint = schema_fingerprint(row_data.keys(), dataset_info)
+        if fingerprint not in self._mappings:
+            future = asyncio.get_running_loop().create_future()
+            self._mappings[fingerprint] = future
+            try:
+                future.set_result(await self._resolve_schema(row_data))
+            except Exception as e:
+                # Let the next row with this schema try again
+                del self._mappings[fingerprint]
+                future.set_exception(e)
+                raise
+        return await asyncio.shield(self._mappings[fingerprint])
+
+    async def _resolve_schema(self, row_data: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        if self.use_heuristics:
+            mapping = heuristic_field_mapping(row_data.keys())
+            if mapping is not None:
+                self.heuristic_hits += 1
+                return mapping
+        self.llm_calls += 1
+        fields = await field_filter(field_filter_payload(row_data), list(row_data.keys()))
+        # Guard against field names the model invented
+        if fields.get("input") not in row_data or fields.get("output") not in row_data:
+            return {"input": None, "output": None}
+        return {"input": fields["input"], "output": fields["output"]}
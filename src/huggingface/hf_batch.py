@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, List
+
+from .hf_pipeline import hf_data_stream, ResultSink
+from .prefilter import PrefilterCascade, build_prefilter
+from .surrogate import load_surrogate
+from ..utils.dedup import NearDuplicateIndex
+from ..utils.journal import RunJournal
+from ..utils.result_store import ShardedResultWriter
+from ..utils.speculation import SpeculationPolicy
+
+TASK_FIELDS = ("task_description", "input_format", "output_format")
+# 清单中可按任务覆盖的 hf_data_stream 参数
+TASK_OVERRIDES = ("task_datasets_count", "task_data_samples", "row_sampling", "ranking")
+
+
+def _task_name(task: Dict[str, Any]) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", task["task_description"].lower()).strip("-")[:40]
+    digest = hashlib.sha1(task["task_description"].encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a task manifest: a JSON list or JSONL file of objects with task_description, input_format and
+    output_format, plus an optional `name` (the output directory) and per-task task_datasets_count,
+    task_data_samples, row_sampling, ranking, prefilter and speculation settings.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        tasks = json.loads(text)
+    else:
+        tasks = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    names = set()
+    for i, task in enumerate(tasks):
+        missing = [field for field in TASK_FIELDS if not task.get(field)]
+        if missing:
+            raise ValueError(f"Task {i} in {path} is missing {missing}")
+        task.setdefault("name", _task_name(task))
+        if task["name"] in names:
+            raise ValueError(f"Duplicate task name {task['name']!r} in {path}")
+        names.add(task["name"])
+    return tasks
+
+
+async def run_task(
+    task,
+    client,
+    output_dir,
+    resume=False,
+    result_formats=("jsonl",),
+    result_shard_size=10000,
+    result_compression=None,
+    dedup_threshold=None,
+    prefilter_settings=None,
+    speculation_settings=None,
+    surrogate_settings=None,
+    **stream_kwargs
+):
+    """
+    Run one manifest task through hf_data_stream, writing results, journal and dedup index under
+    `output_dir`/<name>. `client` and the process-wide LLM client are shared with the other tasks;
+    `stream_kwargs` are the hf_data_stream defaults, overridden by the task's own settings.
+    With `surrogate_settings` (model_dir, explore), the task's SurrogateJudge, if one was trained, pre-screens rows.
+    """
+    task_dir = os.path.join(output_dir, task["name"])
+    os.makedirs(task_dir, exist_ok=True)
+    kwargs = {**stream_kwargs, **{key: task[key] for key in TASK_OVERRIDES if key in task}}
+    prefilter_settings = task.get("prefilter", prefilter_settings)
+    surrogate = load_surrogate(task_description=task["task_description"], **surrogate_settings) if surrogate_settings else None
+    if prefilter_settings is not None:
+        prefilter = build_prefilter(**prefilter_settings, surrogate=surrogate)
+    else:
+        prefilter = PrefilterCascade([surrogate]) if surrogate is not None else None
+    # 接受率因任务而异，每个任务单独统计
+    speculation_settings = task.get("speculation", speculation_settings)
+    speculation = SpeculationPolicy(**speculation_settings) if speculation_settings else None
+    # 去重只在任务内部进行：不同任务可以使用同一条样本
+    dedup_index = (
+        NearDuplicateIndex(os.path.join(task_dir, "dedup_index.sqlite"), threshold=dedup_threshold, resume=resume)
+        if dedup_threshold is not None else None
+    )
+    writer = ShardedResultWriter(
+        os.path.join(task_dir, "results"), formats=result_formats, shard_size=result_shard_size, compression=result_compression
+    )
+    try:
+        with writer, RunJournal(os.path.join(task_dir, "journal.jsonl"), resume=resume) as journal:
+            stats = await hf_data_stream(
+                task["task_description"], task["input_format"], task["output_format"], client,
+                ResultSink(task["task_description"], writer),
+                journal=journal,
+                dedup_index=dedup_index,
+                prefilter=prefilter,
+                speculation=speculation,
+                **kwargs
+            )
+    finally:
+        if dedup_index is not None:
+            dedup_index.close()
+    return {"records_written": writer.records_written, "shards": writer.shards, "pipeline": stats}
+
+
+async def run_batch(tasks, client, output_dir=os.path.join("hf_logs", "batch"), max_concurrent_tasks=4, **task_kwargs):
+    """
+    Run manifest tasks concurrently in the current event loop, at most `max_concurrent_tasks` at a time.
+    All tasks share `client`, the process-wide LLM client and therefore their connection pools,
+    concurrency/rate limits and caches. A failing task is logged and reported without stopping the others.
+    Writes `output_dir`/batch_summary.json and returns the per-task summaries.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_tasks)
+
+    async def run_one(task):
+        async with semaphore:
+            logging.info(f"▶️ Task {task['name']} started")
+            start = time.perf_counter()
+            summary = {"name": task["name"], "task_description": task["task_description"]}
+            try:
+                summary.update(await run_task(task, client, output_dir, **task_kwargs))
+                summary["status"] = "ok"
+            except Exception as e:
+                logging.exception(f"Task {task['name']} failed")
+                summary.update(status="failed", error=repr(e))
+            summary["seconds"] = round(time.perf_counter() - start, 3)
+            logging.info(f"⏹️ Task {task['name']} {summary['status']} in {summary['seconds']}s")
+            return summary
+
+    summaries = await asyncio.gather(*(run_one(task) for task in tasks))
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summaries, f, ensure_ascii=False, indent=2, default=str)
+    return summaries
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from .field_mapping import FieldMapper
+from .hf_pipeline import discover_candidates, hf_data_process_sample
+from ..utils.budget import ThompsonAllocator
+from ..utils.journal import RunJournal
+from ..utils.metrics import get_metrics
+
+
+async def hf_data_budgeted(
+    task_description,
+    input_format,
+    output_format,
+    client,
+    sink,
+    target_accepted,
+    budget=None,
+    task_datasets_count=5,
+    max_rows_per_dataset=500,
+    row_sampling=None,
+    ranking=None,
+    concurrency=16,
+    prefilter=None,
+    speculation=None,
+    dedup_index=None,
+    seed=0
+):
+    """
+    Spend a SpendBudget where it yields the most accepted samples.
+    Instead of a fixed number of rows per dataset, rows are drawn one at a time (up to
+    `max_rows_per_dataset` per dataset, via AsyncHFClient.iter_rows with `row_sampling`, random by default)
+    from the dataset a ThompsonAllocator picks from the acceptance rates seen so far.
+    Stops once `target_accepted` samples were accepted, the budget is exhausted or every dataset ran out;
+    rows already in flight at that point (up to `concurrency`) still finish and are kept.
+    With a NearDuplicateIndex, rows duplicating an earlier input are dropped before judging; they still
+    count as rejected draws of their dataset.
+    Accepted samples go to `sink` as hf_data_stream items. Returns run statistics.
+    """
+    metrics = get_metrics()
+    _, pool, dataset_ids = await discover_candidates(task_description, client, task_datasets_count, ranking)
+    allocator = ThompsonAllocator(dataset_ids, seed=seed)
+    field_mapper = FieldMapper()
+    row_sampling = {"mode": "random", "seed": seed, **(row_sampling or {})}
+    streams, infos, locks = {}, {}, {dataset_id: asyncio.Lock() for dataset_id in dataset_ids}
+    stats = {"rows": 0, "accepted": 0, "failed": 0}
+
+    def done():
+        return stats["accepted"] >= target_accepted or (budget is not None and budget.exhausted())
+
+    async def next_row(dataset_id):
+        # 同一个异步生成器不能被多个 worker 同时迭代
+        async with locks[dataset_id]:
+            try:
+                if dataset_id not in streams:
+                    infos[dataset_id] = await client.get_info(dataset_id)
+                    streams[dataset_id] = client.iter_rows(dataset_id, max_rows=max_rows_per_dataset, **row_sampling)
+                return await anext(streams[dataset_id], None)
+            except Exception as e:
+                logging.warning(f"Failed to read rows of {dataset_id}: {e!r}")
+                return None
+
+    async def worker():
+        while not done():
+            dataset_id = allocator.choose()
+            if dataset_id is None:
+                return
+            row = await next_row(dataset_id)
+            if row is None:
+                allocator.close(dataset_id)
+                continue
+            stats["rows"] += 1
+            try:
+                result = await hf_data_process_sample(
+                    row, task_description, input_format, output_format, field_mapper, infos[dataset_id], speculation, prefilter,
+                    dedup_index, RunJournal.row_key(dataset_id, row.get("row_idx"))
+                )
+            except Exception as e:
+                stats["failed"] += 1
+                metrics.incr("sample.failed")
+                logging.warning(f"Row {row.get('row_idx')} of {dataset_id} failed: {e!r}")
+                result = None
+            allocator.record(dataset_id, result is not None)
+            if result is None:
+                continue
+            stats["accepted"] += 1
+            original_sample, sample_scores, formatted_sample = result
+            await sink({
+                "keyword": pool.primary_keyword(dataset_id),
+                "keywords": pool.keywords(dataset_id),
+                "dataset_id": dataset_id,
+                "dataset_info": infos[dataset_id],
+                "row": row,
+                "original_sample": original_sample,
+                "scores": sample_scores,
+                "formatted_sample": formatted_sample
+            })
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    finally:
+        for stream in streams.values():
+            await stream.aclose()
+
+    stats["spent"] = budget.spent() if budget is not None else None
+    stats["datasets"] = allocator.stats()
+    # 按抽取行数列出各数据集的通过情况
+    for dataset_id, arm in sorted(stats["datasets"].items(), key=lambda item: -item[1]["pulls"]):
+        if arm["pulls"]:
+            logging.info(f"{dataset_id}: {arm['accepted']}/{arm['accepted'] + arm['rejected']} accepted")
+    logging.info(f"Budgeted run: {stats['accepted']}/{target_accepted} accepted from {stats['rows']} rows, spent {stats['spent']}")
+    return stats
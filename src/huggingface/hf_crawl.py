@@ -1,21 +1,55 @@
 import re
 import ast
-import json
+import asyncio
 
 from ..utils.llm_client import chat_complete
+from ..utils.json_extract import extract_json, extract_json_items
+from ..utils.metrics import get_metrics
+from ..utils.prompt_budget import count_tokens, fit_sample, row_preview
 from ..prompt.hf_prompts import (
     KEYWORD_EXTRACTION_PROMPT,
     FIELD_FILTER_PROMPT,
     FORMAT_CONVERSION_PROMPT,
+    FORMAT_CONVERSION_BATCH_PROMPT,
     INSTRUCTION_JUDGE_PROMPT,
+    INSTRUCTION_JUDGE_BATCH_PROMPT,
     SOLVABLE_JUDGE_PROMPT,
     DATA_GENERATOR_ZERO_SHOT_PROMPT,
-    DATA_GENERATOR_FEW_SHOT_PROMPT
+    DATA_GENERATOR_FEW_SHOT_PROMPT,
+    DATA_GENERATOR_BATCH_PROMPT
 )
 
+# Output token caps per call type; batch entries are per sample
+MAX_TOKENS = {
+    "keyword_extraction": 128,
+    "field_filter": 64,
+    "instruction_judge": 128,
+    "instruction_judge_batch": 96,
+    "format_conversion": 4096,
+    "format_conversion_batch": 2048,
+    "solvable_judge": 16,
+    "data_generator": 4096,
+    "data_generator_batch": 768,
+}
+MAX_BATCH_TOKENS = 8192
+# Prompt token budgets per call type (for batch calls, per sample), measured with prompt_budget.count_tokens
+MAX_PROMPT_TOKENS = {
+    "field_filter": 1024,
+    "instruction_judge": 3072,
+    "format_conversion": 8192,
+}
+
+
+def _batch_max_tokens(call_type, count):
+    return min(MAX_TOKENS[call_type] * count + 64, MAX_BATCH_TOKENS)
+
+
 async def keyword_extraction(task_description):
     prompt = KEYWORD_EXTRACTION_PROMPT.format(task_description=task_description)
-    output = await chat_complete(prompt)
+    output = await chat_complete(prompt, max_tokens=MAX_TOKENS["keyword_extraction"], structured="array")
+    keywords = extract_json(output, "[")
+    if isinstance(keywords, list):
+        return keywords
     match = re.search(r'\[.*\]', output, re.S)
     if match:
         keywords = ast.literal_eval(match.group())
@@ -24,65 +58,170 @@ async def keyword_extraction(task_description):
     return keywords
 
 
+def sample_fits_conversion(sample):
+    """
+    Whether format_conversion can rewrite `sample` whole: it must fit both the prompt budget and
+    the completion cap, since the converted sample is about as long as the original.
+    """
+    limit = min(MAX_PROMPT_TOKENS["format_conversion"], MAX_TOKENS["format_conversion"])
+    return sum(count_tokens(value) for value in sample.values()) <= limit
+
+
+def sample_fits_conversion_batch(sample):
+    """
+    Whether `sample` can share a format_conversion_batch request: its converted form must fit the
+    per-sample completion share of the batch, or the reply is truncated and every item falls back.
+    """
+    return sum(count_tokens(value) for value in sample.values()) <= MAX_TOKENS["format_conversion_batch"]
+
+
+def judge_payload(sample):
+    """
+    The sample text shown to instruction_judge, with long fields truncated to the judge budget.
+    """
+    fitted = fit_sample(sample, MAX_PROMPT_TOKENS["instruction_judge"])
+    if fitted is not sample:
+        get_metrics().incr("prompt.truncated")
+    return str(fitted if fitted is not None else sample)
+
+
+def field_filter_payload(row_data):
+    """
+    Keys plus short value previews: enough to pick the input/output columns without sending whole documents.
+    """
+    return str(row_preview(row_data, MAX_PROMPT_TOKENS["field_filter"]))
+
+
 async def field_filter(row, legal_keys):
     example_text = """{'question': 'If an angle measures 120 degrees, what is its reference angle?', 'answer': 'The reference angle is found by subtracting ...', 'topic': 'Trigonometry Basics'}"""
     prompt = FIELD_FILTER_PROMPT.format(example_text=example_text, row=row, legal_keys=legal_keys)
-    output = await chat_complete(prompt)
-    match = re.search(r'\{.*\}', output, re.S)
-    if match:
-        json_str = match.group().strip()
-        try:
-            return json.loads(json_str)
-        except:
-            return {"input": None, "output": None}
+    output = await chat_complete(prompt, max_tokens=MAX_TOKENS["field_filter"], structured="object")
+    fields = extract_json(output)
+    if isinstance(fields, dict):
+        return fields
     return {"input": None, "output": None}
 
 
 async def format_conversion(input, output, input_format, output_format):
     prompt = FORMAT_CONVERSION_PROMPT.format(input=input, output=output, input_format=input_format, output_format=output_format)
-    output_text = await chat_complete(prompt)
-    match = re.search(r'\{.*\}', output_text, re.S)
-    if match:
-        try:
-            return json.loads(match.group().strip())
-        except:
-            return {"input": None, "output": None}
+    output_text = await chat_complete(prompt, max_tokens=MAX_TOKENS["format_conversion"], structured="object")
+    formatted = extract_json(output_text)
+    if isinstance(formatted, dict):
+        return formatted
     return {"input": None, "output": None}
 
 
 async def instruction_judge(task_description, instruction_sample):
     prompt = INSTRUCTION_JUDGE_PROMPT.format(task_description=task_description, instruction_sample=instruction_sample)
-    output = await chat_complete(prompt)
-    match = re.search(r'\{.*\}', output, re.S)
-    if match:
-        try:
-            return json.loads(match.group().strip())
-        except:
-            return {"Relevance": 5, "Correctness": 5, "Helpfulness": 5, "Clarity": 5, "Difficulty": 5}
+    output = await chat_complete(prompt, max_tokens=MAX_TOKENS["instruction_judge"], structured="object")
+    scores = extract_json(output)
+    if isinstance(scores, dict):
+        return scores
     return {"Relevance": 5, "Correctness": 5, "Helpfulness": 5, "Clarity": 5, "Difficulty": 5}
 
 
+JUDGE_CRITERIA = ["Relevance", "Correctness", "Helpfulness", "Clarity", "Difficulty"]
+
+
+def parse_batch_output(output_text, count, required_keys):
+    """
+    Parse a JSON array of per-sample results keyed by "id".
+    Returns a list of length `count` with None for every item that is missing or malformed.
+    """
+    results = [None] * count
+    items = extract_json(output_text, "[")
+    if not isinstance(items, list):
+        return results
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        idx = item.pop("id", position)
+        try:
+            idx = int(idx)
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < count and all(key in item for key in required_keys):
+            results[idx] = {key: item[key] for key in required_keys}
+    return results
+
+
+async def instruction_judge_batch(task_description, instruction_samples):
+    """
+    Judge several samples with one request; items whose result can't be parsed fall back to instruction_judge.
+    """
+    if len(instruction_samples) == 1:
+        return [await instruction_judge(task_description, instruction_samples[0])]
+    samples_text = "\n\n".join(
+        [f"### Sample {i}\n{sample}" for i, sample in enumerate(instruction_samples)]
+    )
+    prompt = INSTRUCTION_JUDGE_BATCH_PROMPT.format(
+        count=len(instruction_samples),
+        task_description=task_description,
+        instruction_samples=samples_text
+    )
+    output = await chat_complete(
+        prompt,
+        max_tokens=_batch_max_tokens("instruction_judge_batch", len(instruction_samples)),
+        structured="array"
+    )
+    results = parse_batch_output(output, len(instruction_samples), JUDGE_CRITERIA)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    fallback = await asyncio.gather(*[instruction_judge(task_description, instruction_samples[i]) for i in missing])
+    for i, result in zip(missing, fallback):
+        results[i] = result
+    return results
+
+
+async def format_conversion_batch(samples, input_format, output_format):
+    """
+    Convert several {"input", "output"} samples with one request; unparseable items fall back to format_conversion.
+    """
+    if len(samples) == 1:
+        return [await format_conversion(samples[0]["input"], samples[0]["output"], input_format, output_format)]
+    samples_text = "\n\n".join(
+        [f"### Sample {i}\nOriginal Input:\n{sample['input']}\n\nOriginal Output:\n{sample['output']}" for i, sample in enumerate(samples)]
+    )
+    prompt = FORMAT_CONVERSION_BATCH_PROMPT.format(
+        count=len(samples),
+        input_format=input_format,
+        output_format=output_format,
+        samples=samples_text
+    )
+    output_text = await chat_complete(
+        prompt,
+        max_tokens=_batch_max_tokens("format_conversion_batch", len(samples)),
+        structured="array"
+    )
+    results = parse_batch_output(output_text, len(samples), ["input", "output"])
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    fallback = await asyncio.gather(*[
+        format_conversion(samples[i]["input"], samples[i]["output"], input_format, output_format) for i in missing
+    ])
+    for i, result in zip(missing, fallback):
+        results[i] = result
+    return results
+
+
 async def solvable_judge(instruction_sample):
     solve_prompt = f"Please think step by step and answer this question.\n{instruction_sample['input']}"
     solution = await chat_complete(solve_prompt)
     judge_prompt = SOLVABLE_JUDGE_PROMPT.format(instruction_sample=instruction_sample, solution=solution)
-    judge_output = (await chat_complete(judge_prompt)).strip()
+    judge_output = (await chat_complete(judge_prompt, max_tokens=MAX_TOKENS["solvable_judge"])).strip()
     return "true" in judge_output.lower()
 
 
-async def data_generator_zero_shot(task_description, input_format, output_format):
+async def data_generator_zero_shot(task_description, input_format, output_format, temperature=0):
     prompt = DATA_GENERATOR_ZERO_SHOT_PROMPT.format(task_description=task_description, input_format=input_format, output_format=output_format)
-    output_text = await chat_complete(prompt)
-    match = re.search(r'\{.*\}', output_text, re.S)
-    if match:
-        try:
-            return json.loads(match.group().strip())
-        except:
-            return {"input": None, "output": None}
+    output_text = await chat_complete(prompt, temperature=temperature, max_tokens=MAX_TOKENS["data_generator"], structured="object")
+    sample = extract_json(output_text)
+    if isinstance(sample, dict):
+        return sample
     return {"input": None, "output": None}
 
 
-async def data_generator_few_shot(task_description, input_format, output_format, examples):
+async def data_generator_few_shot(task_description, input_format, output_format, examples, temperature=0):
     example_text = "\n\n".join(
         [f"Example {i+1}:\nInput: {ex['input']}\nOutput: {ex['output']}" for i, ex in enumerate(examples)]
     )
@@ -92,11 +231,39 @@ async def data_generator_few_shot(task_description, input_format, output_format,
         output_format=output_format,
         example_text=example_text
     )
-    output_text = await chat_complete(prompt)
-    match = re.search(r'\{.*\}', output_text, re.S)
-    if match:
-        try:
-            return json.loads(match.group().strip())
-        except:
-            return {"input": None, "output": None}
+    output_text = await chat_complete(prompt, temperature=temperature, max_tokens=MAX_TOKENS["data_generator"], structured="object")
+    sample = extract_json(output_text)
+    if isinstance(sample, dict):
+        return sample
     return {"input": None, "output": None}
+
+
+async def data_generator_batch(task_description, input_format, output_format, count, examples=None, temperature=1.0):
+    """
+    Generate up to `count` samples with one request, optionally guided by few-shot `examples`.
+    Returns only the well-formed {"input", "output"} items, so the result may be shorter than `count`.
+    """
+    example_section = ""
+    if examples:
+        example_text = "\n\n".join(
+            [f"Example {i+1}:\nInput: {ex['input']}\nOutput: {ex['output']}" for i, ex in enumerate(examples)]
+        )
+        example_section = f"\n**Few-shot Examples:**\n{example_text}\n"
+    prompt = DATA_GENERATOR_BATCH_PROMPT.format(
+        count=count,
+        task_description=task_description,
+        input_format=input_format,
+        output_format=output_format,
+        example_section=example_section
+    )
+    output_text = await chat_complete(
+        prompt,
+        temperature=temperature,
+        max_tokens=_batch_max_tokens("data_generator_batch", count),
+        structured="array"
+    )
+    return [
+        {"input": sample["input"], "output": sample["output"]}
+        for sample in extract_json_items(output_text)
+        if isinstance(sample, dict) and sample.get("input") and sample.get("output")
+    ]
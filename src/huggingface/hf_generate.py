@@ -0,0 +1,190 @@
+import os
+import glob
+import gzip
+import hashlib
+import json
+import math
+import random
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from .hf_crawl import data_generator_batch, instruction_judge_batch
+from .hf_pipeline import judge_sample
+from ..utils.batching import MicroBatcher
+from ..utils.dedup import normalize_text
+from ..utils.metrics import get_metrics
+
+SYNTHETIC_DATASET_ID = "synthetic"
+
+
+def load_examples(result_dir: str, limit: Optional[int] = 200) -> List[Dict[str, Any]]:
+    """
+    Accepted samples from the JSONL shards a ShardedResultWriter wrote to `result_dir`,
+    as {"input", "output"} pairs in the target format, for use as few-shot examples.
+    """
+    examples = []
+    for path in sorted(glob.glob(os.path.join(result_dir, "part-*.jsonl*"))):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, mode="rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("formatted_input") and record.get("formatted_output"):
+                    examples.append({"input": record["formatted_input"], "output": record["formatted_output"]})
+                if limit is not None and len(examples) >= limit:
+                    return examples
+    return examples
+
+
+class ExampleRotation:
+    """
+    Hands out `per_call` few-shot examples at a time from a shuffled pool, cycling through all of them
+    before repeating, so concurrent generation calls are steered in different directions.
+    """
+
+    def __init__(self, examples: List[Dict[str, Any]], per_call: int = 3, seed: int = 0):
+        self.examples = list(examples)
+        self.per_call = min(per_call, len(self.examples))
+        self._rng = random.Random(seed)
+        self._rng.shuffle(self.examples)
+        self._position = 0
+
+    def next(self) -> List[Dict[str, Any]]:
+        if not self.per_call:
+            return []
+        if self._position + self.per_call > len(self.examples):
+            self._rng.shuffle(self.examples)
+            self._position = 0
+        chosen = self.examples[self._position:self._position + self.per_call]
+        self._position += self.per_call
+        return chosen
+
+
+async def _gather_or_cancel(coroutines):
+    """
+    asyncio.gather that cancels the remaining coroutines when one raises, instead of leaving them running.
+    """
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def hf_data_generate(
+    task_description,
+    input_format,
+    output_format,
+    sink,
+    target_count,
+    samples_per_call=10,
+    concurrency=8,
+    examples=None,
+    examples_per_call=3,
+    temperature=1.0,
+    dedup_index=None,
+    judge=False,
+    judge_batch_size=1,
+    batch_token_budget=None,
+    max_calls=None,
+    seed=0
+):
+    """
+    Generate `target_count` synthetic samples with `concurrency` parallel requests of
+    `samples_per_call` samples each, and stream the accepted ones to `sink` as hf_data_stream items.
+    Few-shot `examples` (e.g. from load_examples) are rotated across calls. Samples repeating an
+    earlier input or an example are dropped, or near-duplicates too with a NearDuplicateIndex.
+    With `judge`, samples must also pass instruction_judge like crawled ones.
+    `max_calls` (default three times the calls needed) bounds the spend when few samples are accepted.
+    """
+    metrics = get_metrics()
+    rotation = ExampleRotation(examples or [], examples_per_call, seed)
+    if max_calls is None:
+        max_calls = 3 * math.ceil(target_count / samples_per_call) + concurrency
+    # 精确去重：同一次运行内和 few-shot 示例本身都不重复输出
+    seen = {normalize_text(example["input"]) for example in examples or []}
+    judge_batcher = None
+    if judge and judge_batch_size > 1:
+        judge_batcher = MicroBatcher(
+            lambda samples: instruction_judge_batch(task_description, samples),
+            max_batch_size=judge_batch_size,
+            token_budget=batch_token_budget
+        )
+    stats = {"calls": 0, "failed_calls": 0, "generated": 0, "duplicates": 0, "rejected": 0, "failed": 0, "accepted": 0}
+
+    async def is_duplicate(sample):
+        text = normalize_text(sample["input"])
+        if text in seen:
+            return True
+        seen.add(text)
+        if dedup_index is not None:
+            # 按内容生成键：序号在不同运行之间会重复，而相同键的条目不算重复
+            key = f"{SYNTHETIC_DATASET_ID}#{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+            return await asyncio.to_thread(dedup_index.check_and_add, sample["input"], key) is not None
+        return False
+
+    async def accept(sample):
+        try:
+            scores = await judge_sample(sample, task_description, judge_batcher) if judge else {}
+        except Exception as e:
+            # 单个样本评分失败（重试用尽、分数无法解析）只丢弃该样本
+            stats["failed"] += 1
+            metrics.incr("sample.failed")
+            logging.warning(f"Judging a generated sample failed: {e!r}")
+            return
+        if scores is None:
+            stats["rejected"] += 1
+            metrics.incr("generate.rejected")
+            return
+        if stats["accepted"] >= target_count:
+            return
+        row_idx = stats["accepted"]
+        stats["accepted"] += 1
+        metrics.incr("generate.accepted")
+        await sink({
+            "keyword": SYNTHETIC_DATASET_ID,
+            "keywords": [],
+            "dataset_id": SYNTHETIC_DATASET_ID,
+            "dataset_info": None,
+            "row": {"row_idx": row_idx, "row": sample},
+            "original_sample": sample,
+            "scores": scores,
+            "formatted_sample": sample
+        })
+
+    async def worker():
+        while stats["accepted"] < target_count and stats["calls"] < max_calls:
+            stats["calls"] += 1
+            count = min(samples_per_call, max(1, target_count - stats["accepted"]))
+            try:
+                with metrics.span("generate.call", samples=count):
+                    samples = await data_generator_batch(
+                        task_description, input_format, output_format, count, rotation.next(), temperature
+                    )
+            except Exception as e:
+                stats["failed_calls"] += 1
+                logging.warning(f"Generation call failed: {e!r}")
+                continue
+            stats["generated"] += len(samples)
+            metrics.incr("generate.samples", len(samples))
+            fresh = []
+            for sample in samples:
+                if await is_duplicate(sample):
+                    stats["duplicates"] += 1
+                    metrics.incr("generate.duplicates")
+                else:
+                    fresh.append(sample)
+            await _gather_or_cancel(accept(sample) for sample in fresh)
+
+    # 写入失败等错误会终止整个生成，其余 worker 随之取消，不会在返回后继续写 sink
+    await _gather_or_cancel(worker() for _ in range(concurrency))
+    if stats["accepted"] < target_count:
+        logging.warning(f"Generated {stats['accepted']}/{target_count} samples before reaching {max_calls} calls")
+    logging.info(f"Generation stats: {stats}")
+    return stats
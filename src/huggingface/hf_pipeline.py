@@ -0,0 +1,550 @@
+import os
+import csv
+import logging
+import asyncio
+from typing import Optional, Dict, Any
+from tqdm.asyncio import tqdm_asyncio
+
+from ..utils.pipeline import Stage, StreamingPipeline
+from ..utils.batching import MicroBatcher
+from ..utils.journal import RunJournal
+from ..utils.result_store import make_result_record
+from ..utils.metrics import get_metrics
+from .field_mapping import FieldMapper
+from .candidates import CandidatePool
+from .ranking import rank_candidates
+from .surrogate import get_judge_log
+from .hf_crawl import keyword_extraction, instruction_judge, instruction_judge_batch, format_conversion, format_conversion_batch, judge_payload, sample_fits_conversion, sample_fits_conversion_batch
+
+CSV_HEADER = [
+    "Task_Definition", "Keyword", "Dataset_ID",
+    "Original_Input", "Original_Output",
+    "Judge_Scores",
+    "Formatted_Input", "Formatted_Output"
+]
+
+
+async def discover_candidates(task_description, client, task_datasets_count=5, ranking=None):
+    """
+    Extract the task keywords, search the Hub for each and merge the results into a CandidatePool.
+    Returns (keywords, pool, dataset ids to fetch): all candidates in discovery order or, with
+    `ranking`, the best-ranked ones in rank order.
+    """
+    # 提取任务关键词
+    task_keywords = await keyword_extraction(task_description)
+    logging.info(f"Extracted Task keywords: {task_keywords}")
+
+    async def search(task_keyword):
+        # 单个关键词搜索失败只跳过该关键词
+        try:
+            return await client.search_datasets(task_keyword, limit=task_datasets_count)
+        except Exception as e:
+            logging.warning(f"Search failed for {task_keyword}: {e!r}")
+            return []
+
+    # Hugging Face 并发搜索所有关键词
+    search_results = await tqdm_asyncio.gather(
+        *[search(task_keyword) for task_keyword in task_keywords],
+        desc="🔍 Searching keywords", unit="keyword"
+    )
+
+    # 合并为去重的候选池，记录每个数据集命中的所有关键词
+    pool = CandidatePool()
+    for task_keyword, task_datasets in zip(task_keywords, search_results):
+        pool.add(task_keyword, task_datasets[:task_datasets_count])
+    logging.info(f"{len(pool)} unique candidate datasets ({pool.duplicates} duplicate hits across keywords)")
+
+    # 按 README / info / 标签与任务的 BM25 相关度排序，只抓取排名靠前的数据集
+    dataset_ids = list(pool)
+    if ranking is not None:
+        dataset_ids = [dataset_id for dataset_id, _ in await rank_candidates(pool, client, task_description, task_keywords, **ranking)]
+    return task_keywords, pool, dataset_ids
+
+
+async def hf_data_crawl(task_description, client, task_datasets_count=5, task_data_samples=5, row_sampling=None, ranking=None):
+    _, pool, dataset_ids = await discover_candidates(task_description, client, task_datasets_count, ranking)
+
+    async def fetch(dataset_id):
+        try:
+            return await client.fetch_dataset(dataset_id, max_rows=task_data_samples, row_sampling=row_sampling)
+        except Exception as e:
+            logging.warning(f"Failed to fetch dataset {dataset_id}: {e!r}")
+            return None
+
+    # 每个候选数据集只获取一次 info / splits / first-rows
+    fetched_results = await tqdm_asyncio.gather(
+        *[fetch(dataset_id) for dataset_id in dataset_ids],
+        desc="📦 Fetching datasets", unit="dataset"
+    )
+
+    # 整合所有的待处理样本，数据集归到第一个命中它的关键词下
+    dataset_map = {}
+    for dataset in fetched_results:
+        if dataset is None:
+            continue
+        dataset_map.setdefault(pool.primary_keyword(dataset["id"]), []).append({
+            "id": dataset["id"],
+            "info": dataset["info"],
+            "rows": dataset["rows"],
+            "keywords": pool.keywords(dataset["id"])
+        })
+    for task_keyword, datasets in dataset_map.items():
+        logging.info(f"Loaded {len(datasets)} datasets for {task_keyword}")
+
+    return dataset_map
+
+
+async def hf_data_crawl_stream(task_description, client, task_datasets_count=5, task_data_samples=5, row_sampling=None, queue_size=256, ranking=None):
+    """
+    Streaming variant of hf_data_crawl.
+    Yields one item per row as soon as it has been fetched, while other searches and fetches are still running.
+    With `row_sampling` (keyword arguments of AsyncHFClient.iter_rows), rows are streamed page by page
+    from /rows (or Parquet) instead of taken from first-rows; a full queue pauses the row fetchers.
+    With `ranking` (keyword arguments of rank_candidates), all searches finish first and only the
+    best-ranked datasets are fetched, in rank order.
+    """
+    task_keywords = await keyword_extraction(task_description)
+    logging.info(f"Extracted Task keywords: {task_keywords}")
+
+    pool = CandidatePool()
+    queue = asyncio.Queue(maxsize=queue_size)
+    harvests = []
+    done = object()
+
+    def make_item(dataset_id, dataset_info, row):
+        return {
+            "keyword": pool.primary_keyword(dataset_id),
+            "keywords": pool.keywords(dataset_id),
+            "dataset_id": dataset_id,
+            "dataset_info": dataset_info,
+            "row": row
+        }
+
+    async def harvest(dataset_id):
+        try:
+            if row_sampling is None:
+                dataset = await client.fetch_dataset(dataset_id, max_rows=task_data_samples)
+                logging.info(f"Loaded dataset {dataset_id} ({len(dataset['rows'])} rows) for {pool.primary_keyword(dataset_id)}")
+                for row in dataset["rows"]:
+                    await queue.put(make_item(dataset_id, dataset["info"], row))
+                return
+            dataset_info = await client.get_info(dataset_id)
+            count = 0
+            async for row in client.iter_rows(dataset_id, max_rows=task_data_samples, **row_sampling):
+                await queue.put(make_item(dataset_id, dataset_info, row))
+                count += 1
+            logging.info(f"Streamed {count} rows of {dataset_id} for {pool.primary_keyword(dataset_id)}")
+        except Exception as e:
+            logging.warning(f"Failed to fetch dataset {dataset_id}: {e!r}")
+
+    async def search(task_keyword):
+        try:
+            task_datasets = await client.search_datasets(task_keyword, limit=task_datasets_count)
+        except Exception as e:
+            logging.warning(f"Search failed for {task_keyword}: {e!r}")
+            return
+        # 已被其他关键词找到的数据集只追加关键词，不重复获取
+        for dataset_id in pool.add(task_keyword, task_datasets[:task_datasets_count]):
+            if ranking is None:
+                harvests.append(asyncio.ensure_future(harvest(dataset_id)))
+
+    async def produce():
+        try:
+            await asyncio.gather(*[search(task_keyword) for task_keyword in task_keywords])
+            if ranking is not None:
+                ranked = await rank_candidates(pool, client, task_description, task_keywords, **ranking)
+                harvests.extend(asyncio.ensure_future(harvest(dataset_id)) for dataset_id, _ in ranked)
+            await asyncio.gather(*harvests)
+        finally:
+            await queue.put(done)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            yield item
+        await producer
+    finally:
+        producer.cancel()
+        for task in harvests:
+            task.cancel()
+
+
+async def extract_sample(row_data, field_mapper, dataset_info=None) -> Optional[Dict[str, Any]]:
+    # 检查哪些字段对应Input和Output（同一数据集 schema 只解析一次）
+    fields = await field_mapper.resolve(row_data, dataset_info)
+    if fields["input"] is None or fields["output"] is None:
+        logging.info("Skipping row due to missing input/output fields.")
+        return None
+
+    # 获取原始的Input和Output文本
+    input_text = row_data.get(fields["input"])
+    output_text = row_data.get(fields["output"])
+    if input_text is None or output_text is None:
+        logging.info("Skipping row due to None input/output values.")
+        return None
+
+    sample = {
+        "input": input_text,
+        "output": output_text
+    }
+    # 超出格式转换预算的样本无法完整改写，在评分之前跳过
+    if not sample_fits_conversion(sample):
+        logging.info("Skipping row too long for format conversion.")
+        get_metrics().incr("prompt.skipped")
+        return None
+    return sample
+
+
+async def judge_sample(original_sample, task_description, judge_batcher=None) -> Optional[Dict[str, Any]]:
+    # 对原始样本进行任务适应性评分，只保留每个分数大于8的
+    if judge_batcher is not None:
+        sample_scores = await judge_batcher.submit(judge_payload(original_sample))
+    else:
+        sample_scores = await instruction_judge(task_description, judge_payload(original_sample))
+    low_scores = [(criteria, score) for criteria, score in sample_scores.items() if int(score) < 8]
+    # 记录每次评分结果，作为本地代理评分模型的训练数据
+    judge_log = get_judge_log()
+    if judge_log is not None:
+        judge_log.record(task_description, original_sample, sample_scores, not low_scores)
+    if low_scores:
+        criteria, score = low_scores[0]
+        logging.info(f"Skipping row due to low score on {criteria}: {score}")
+        return None
+    return sample_scores
+
+
+async def convert_sample(original_sample, input_format, output_format, convert_batcher=None) -> Optional[Dict[str, Any]]:
+    # 对照任务要求的标准格式进行转换；超出批量调用单样本输出上限的长样本单独转换
+    if convert_batcher is not None and sample_fits_conversion_batch(original_sample):
+        formatted_sample = await convert_batcher.submit(original_sample)
+    else:
+        formatted_sample = await format_conversion(
+            original_sample["input"],
+            original_sample["output"],
+            input_format,
+            output_format
+        )
+    if formatted_sample.get("input") is None or formatted_sample.get("output") is None:
+        logging.info("Skipping row due to None formatted input/output values.")
+        return None
+    return formatted_sample
+
+
+async def _timed_step(name, step):
+    # 记录每一步的耗时和通过/拒绝数
+    metrics = get_metrics()
+    with metrics.span(f"sample.{name}"):
+        result = await step
+    metrics.incr(f"sample.{name}.{'rejected' if result is None else 'accepted'}")
+    return result
+
+
+async def hf_data_process_sample(row, task_description, input_format, output_format, field_mapper, dataset_info=None, speculation=None, prefilter=None, dedup_index=None, row_key=None):
+    # 单个样本过滤和处理，整行耗时记在 "sample" 下
+    with get_metrics().span("sample"):
+        original_sample = await _timed_step("extract", extract_sample(row["row"], field_mapper, dataset_info))
+        if original_sample is None:
+            return None
+
+        if prefilter is not None:
+            rejected_by = prefilter.filter_batch([original_sample])[0]
+            if rejected_by is not None:
+                logging.info(f"Skipping row rejected by pre-filter rule: {rejected_by}")
+                return None
+
+        if dedup_index is not None:
+            # 与流水线相同：评分之前按输入文本去重，MinHash 计算放到线程中，不阻塞事件循环
+            duplicate_of = await asyncio.to_thread(dedup_index.check_and_add, original_sample["input"], row_key)
+            if duplicate_of is not None:
+                logging.info(f"Skipping row {row_key} as a duplicate of {duplicate_of}")
+                return None
+
+        if speculation is not None:
+            # 投机模式：格式转换与评分并发，评分未通过时丢弃转换结果
+            sample_scores, formatted_sample = await speculation.run(
+                lambda: _timed_step("judge", judge_sample(original_sample, task_description)),
+                lambda: _timed_step("convert", convert_sample(original_sample, input_format, output_format))
+            )
+            if sample_scores is None or formatted_sample is None:
+                return None
+            return original_sample, sample_scores, formatted_sample
+
+        sample_scores = await _timed_step("judge", judge_sample(original_sample, task_description))
+        if sample_scores is None:
+            return None
+
+        formatted_sample = await _timed_step("convert", convert_sample(original_sample, input_format, output_format))
+        if formatted_sample is None:
+            return None
+
+    return original_sample, sample_scores, formatted_sample
+
+
+async def hf_data_process(dataset_map, task_description, input_format, output_format, speculation=None):
+    all_tasks = []
+    index_map = []
+    field_mapper = FieldMapper()
+
+    # 打包所有任务
+    for keyword, datasets in dataset_map.items():
+        for dataset in datasets:
+            for row in dataset["rows"]:
+                task = asyncio.create_task(hf_data_process_sample(row, task_description, input_format, output_format, field_mapper, dataset["info"], speculation))
+                all_tasks.append(task)
+                index_map.append((keyword, dataset["id"], dataset["info"], dataset.get("keywords", [keyword])))
+
+    logging.info(f"🚀 Launching {len(all_tasks)} async sample-processing tasks...")
+
+    # 全部并发执行；单行失败（重试用尽）只丢弃该行，不影响整批
+    results = await asyncio.gather(*all_tasks, return_exceptions=True)
+    failed = [result for result in results if isinstance(result, Exception)]
+    if failed:
+        get_metrics().incr("sample.failed", len(failed))
+        logging.warning(f"{len(failed)}/{len(results)} rows failed and were dropped; first error: {failed[0]!r}")
+    logging.info(f"Field mapping: {field_mapper.heuristic_hits} schemas matched heuristically, {field_mapper.llm_calls} resolved by LLM")
+    if speculation is not None:
+        logging.info(f"Speculation: {speculation.stats()}")
+
+    processed_data_map = {}
+    dataset_entries = {}
+    for (keyword, dataset_id, dataset_info, keywords), result in zip(index_map, results):
+        if result is None or isinstance(result, Exception):
+            continue
+        original_sample, sample_scores, formatted_sample = result
+        if keyword not in processed_data_map:
+            processed_data_map[keyword] = []
+        # 按 (keyword, dataset_id) 索引查找现有 dataset entry 或新建
+        dataset_entry = dataset_entries.get((keyword, dataset_id))
+        if not dataset_entry:
+            dataset_entry = {"id": dataset_id, "info": dataset_info, "keywords": keywords, "samples": []}
+            dataset_entries[(keyword, dataset_id)] = dataset_entry
+            processed_data_map[keyword].append(dataset_entry)
+        dataset_entry["samples"].append({
+            "original_input": original_sample["input"],
+            "original_output": original_sample["output"],
+            "scores": sample_scores,
+            "formatted_input": formatted_sample["input"],
+            "formatted_output": formatted_sample["output"]
+        })
+
+    return processed_data_map
+
+
+def save_data_csv(dataset_map, task_description):
+    os.makedirs("hf_logs", exist_ok=True)
+    csv_filename = os.path.join("hf_logs", "hf_data_log.csv")
+    with open(csv_filename, mode="w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        # 写入标题行
+        writer.writerow(CSV_HEADER)
+
+        # 遍历 dataset_map 生成每一行
+        for kw, datasets in dataset_map.items():
+            for dataset in datasets:
+                dataset_id = dataset["id"]
+                for sample in dataset["samples"]:
+                    writer.writerow([
+                        task_description, kw, dataset_id,
+                        sample["original_input"], sample["original_output"],
+                        str(sample["scores"]),
+                        sample["formatted_input"], sample["formatted_output"]
+                    ])
+
+    logging.info(f"✅ CSV 文件已生成: {csv_filename}")
+
+
+class CsvSink:
+    """
+    Streaming counterpart of save_data_csv: writes and flushes one CSV row per processed item.
+    """
+
+    def __init__(self, task_description, csv_filename=os.path.join("hf_logs", "hf_data_log.csv")):
+        self.task_description = task_description
+        self.csv_filename = csv_filename
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        if os.path.dirname(self.csv_filename):
+            os.makedirs(os.path.dirname(self.csv_filename), exist_ok=True)
+        self._file = open(self.csv_filename, mode="w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CSV_HEADER)
+        return self
+
+    async def __call__(self, item):
+        self._writer.writerow([
+            self.task_description, item["keyword"], item["dataset_id"],
+            item["original_sample"]["input"], item["original_sample"]["output"],
+            str(item["scores"]),
+            item["formatted_sample"]["input"], item["formatted_sample"]["output"]
+        ])
+        self._file.flush()
+        self.rows_written += 1
+
+    def __exit__(self, *exc):
+        self._file.close()
+        logging.info(f"✅ CSV 文件已生成: {self.csv_filename} ({self.rows_written} rows)")
+
+
+class ResultSink:
+    """
+    Streaming sink that writes typed result records to a ShardedResultWriter.
+    """
+
+    def __init__(self, task_description, writer):
+        self.task_description = task_description
+        self.writer = writer
+
+    async def __call__(self, item):
+        self.writer.write(make_result_record(
+            self.task_description, item["keyword"], item["dataset_id"], item["row"].get("row_idx"),
+            item["original_sample"], item["scores"], item["formatted_sample"]
+        ))
+
+
+async def hf_data_stream(
+    task_description,
+    input_format,
+    output_format,
+    client,
+    sink,
+    task_datasets_count=5,
+    task_data_samples=5,
+    workers=None,
+    queue_size=64,
+    judge_batch_size=1,
+    convert_batch_size=1,
+    batch_token_budget=None,
+    journal=None,
+    dedup_index=None,
+    prefilter=None,
+    row_sampling=None,
+    ranking=None,
+    speculation=None
+):
+    """
+    Run crawl -> field mapping -> judge -> format conversion -> sink as one streaming pipeline.
+    `workers` maps stage names ("fields", "judge", "convert") to worker counts.
+    With a batch size above 1, concurrent judge/convert calls are packed into multi-sample requests.
+    With a RunJournal, every stage result is checkpointed and results already in the journal are reused.
+    With a NearDuplicateIndex, rows whose input duplicates an earlier one are dropped before judging.
+    With a PrefilterCascade, rows failing its local rules (including a SurrogateJudge, see build_prefilter)
+    are dropped before judging; rows are gathered into small batches so the rules run over many rows at once.
+    With `row_sampling`, up to `task_data_samples` rows per dataset are streamed from /rows or Parquet
+    (see AsyncHFClient.iter_rows) instead of taken from first-rows.
+    With `ranking`, only the candidates whose README, info and tags rank best against the task
+    (BM25, see rank_candidates) are fetched.
+    With a SpeculationPolicy, judge and convert run as one stage that may start the conversion
+    alongside the judge and discard it when the row is rejected.
+    """
+    workers = {"fields": 4, "prefilter": 64, "judge": 16, "convert": 16, **(workers or {})}
+    field_mapper = FieldMapper()
+    judge_batcher = None
+    convert_batcher = None
+    prefilter_batcher = None
+    if prefilter is not None:
+        async def prefilter_batch(samples):
+            return prefilter.filter_batch(samples)
+
+        prefilter_batcher = MicroBatcher(prefilter_batch, max_batch_size=64, max_wait=0.05)
+    if judge_batch_size > 1:
+        judge_batcher = MicroBatcher(
+            lambda samples: instruction_judge_batch(task_description, samples),
+            max_batch_size=judge_batch_size,
+            token_budget=batch_token_budget
+        )
+    if convert_batch_size > 1:
+        convert_batcher = MicroBatcher(
+            lambda samples: format_conversion_batch(samples, input_format, output_format),
+            max_batch_size=convert_batch_size,
+            token_budget=batch_token_budget
+        )
+
+    async def checkpointed(item, stage, compute):
+        if journal is None:
+            return await compute()
+        if journal.has(item["key"], stage):
+            return journal.get(item["key"], stage)
+        value = await compute()
+        journal.record(item["key"], stage, value)
+        return value
+
+    async def fields_stage(item):
+        item["key"] = RunJournal.row_key(item["dataset_id"], item["row"].get("row_idx"))
+        item["original_sample"] = await checkpointed(
+            item, "sample", lambda: extract_sample(item["row"]["row"], field_mapper, item["dataset_info"])
+        )
+        return item if item["original_sample"] is not None else None
+
+    async def prefilter_stage(item):
+        rejected_by = await prefilter_batcher.submit(item["original_sample"])
+        if rejected_by is not None:
+            logging.info(f"Skipping row {item['key']} rejected by pre-filter rule: {rejected_by}")
+            return None
+        return item
+
+    async def dedup_stage(item):
+        # MinHash 计算放到线程中，不阻塞事件循环
+        duplicate_of = await asyncio.to_thread(dedup_index.check_and_add, item["original_sample"]["input"], item["key"])
+        if duplicate_of is not None:
+            logging.info(f"Skipping row {item['key']} as a duplicate of {duplicate_of}")
+            return None
+        return item
+
+    async def judge_stage(item):
+        item["scores"] = await checkpointed(
+            item, "scores", lambda: judge_sample(item["original_sample"], task_description, judge_batcher)
+        )
+        return item if item["scores"] is not None else None
+
+    async def convert_stage(item):
+        item["formatted_sample"] = await checkpointed(
+            item, "formatted", lambda: convert_sample(item["original_sample"], input_format, output_format, convert_batcher)
+        )
+        return item if item["formatted_sample"] is not None else None
+
+    async def judge_convert_stage(item):
+        item["scores"], item["formatted_sample"] = await speculation.run(
+            lambda: checkpointed(item, "scores", lambda: judge_sample(item["original_sample"], task_description, judge_batcher)),
+            lambda: checkpointed(
+                item, "formatted", lambda: convert_sample(item["original_sample"], input_format, output_format, convert_batcher)
+            )
+        )
+        return item if item["scores"] is not None and item["formatted_sample"] is not None else None
+
+    stages = [Stage("fields", fields_stage, workers=workers["fields"])]
+    if prefilter is not None:
+        stages.append(Stage("prefilter", prefilter_stage, workers=workers["prefilter"]))
+    if dedup_index is not None:
+        # A single worker keeps check-and-add ordered
+        stages.append(Stage("dedup", dedup_stage, workers=1))
+    if speculation is not None:
+        stages.append(Stage("judge_convert", judge_convert_stage, workers=workers["judge"] + workers["convert"]))
+    else:
+        stages += [
+            Stage("judge", judge_stage, workers=workers["judge"]),
+            Stage("convert", convert_stage, workers=workers["convert"]),
+        ]
+    pipeline = StreamingPipeline(stages, queue_size=queue_size)
+
+    source = hf_data_crawl_stream(task_description, client, task_datasets_count, task_data_samples, row_sampling, queue_size, ranking)
+    stats = await pipeline.run(source, sink)
+    logging.info(f"Pipeline stats: {stats}")
+    logging.info(f"Field mapping: {field_mapper.heuristic_hits} schemas matched heuristically, {field_mapper.llm_calls} resolved by LLM")
+    for name, batcher in [("judge", judge_batcher), ("convert", convert_batcher)]:
+        if batcher is not None and batcher.batches:
+            logging.info(f"Batched {name}: {batcher.items} samples in {batcher.batches} requests, {batcher.dropped} cancelled before sending")
+    if prefilter is not None:
+        logging.info(f"Pre-filter: {prefilter.stats()}")
+    if speculation is not None:
+        logging.info(f"Speculation: {speculation.stats()}")
+    if dedup_index is not None:
+        logging.info(f"Dedup: {dedup_index.stats()}")
+    if journal is not None:
+        logging.info(f"Journal: {journal.reused} stage results reused, {journal.recorded} recorded")
+    return stats
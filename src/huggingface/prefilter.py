@@ -0,0 +1,163 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+EMPTY_ANSWERS = {"", "none", "null", "n/a", "nan", "[]", "{}"}
+
+DEFAULT_BLOCKLIST = [
+    r"data:image/[a-z]+;base64,",
+    r"<img\b",
+    r"[A-Za-z0-9+/=]{200,}",
+]
+
+# CJK characters count as one word each since they are not space-separated
+_WORD_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|\w+")
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+class LengthRule:
+    """
+    Reject samples whose input or output falls outside character bounds.
+    """
+
+    name = "length"
+
+    def __init__(self, min_input=10, max_input=8000, min_output=1, max_output=16000):
+        self.min_input = min_input
+        self.max_input = max_input
+        self.min_output = min_output
+        self.max_output = max_output
+
+    def __call__(self, samples: List[Dict[str, Any]]) -> List[bool]:
+        input_lengths = [len(_text(s["input"])) for s in samples]
+        output_lengths = [len(_text(s["output"])) for s in samples]
+        return [
+            self.min_input <= i <= self.max_input and self.min_output <= o <= self.max_output
+            for i, o in zip(input_lengths, output_lengths)
+        ]
+
+
+class PresenceRule:
+    """
+    Reject samples with an empty answer or an input too short to hold a question.
+    """
+
+    name = "presence"
+
+    def __init__(self, min_input_words=3):
+        self.min_input_words = min_input_words
+
+    def __call__(self, samples: List[Dict[str, Any]]) -> List[bool]:
+        return [
+            _text(s["output"]).strip().lower() not in EMPTY_ANSWERS
+            and len(_WORD_PATTERN.findall(_text(s["input"]))) >= self.min_input_words
+            for s in samples
+        ]
+
+
+def dominant_script(text: str) -> Optional[str]:
+    """
+    Name of the writing system most letters in `text` belong to (latin, cjk, cyrillic, arabic, ...).
+    """
+    scripts = Counter()
+    for char in text:
+        if not char.isalpha():
+            continue
+        name = unicodedata.name(char, "")
+        if name.startswith("CJK") or name.startswith("HIRAGANA") or name.startswith("KATAKANA") or name.startswith("HANGUL"):
+            scripts["cjk"] += 1
+        else:
+            scripts[name.split(" ")[0].lower() or "unknown"] += 1
+    if not scripts:
+        return None
+    return scripts.most_common(1)[0][0]
+
+
+class LanguageRule:
+    """
+    Reject samples whose input is written in a script outside `allowed` (e.g. ["latin"]).
+    Text without letters (pure math) passes.
+    """
+
+    name = "language"
+
+    def __init__(self, allowed: Iterable[str] = ("latin",)):
+        self.allowed = set(allowed)
+
+    def __call__(self, samples: List[Dict[str, Any]]) -> List[bool]:
+        scripts = [dominant_script(_text(s["input"])[:2000]) for s in samples]
+        return [script is None or script in self.allowed for script in scripts]
+
+
+class RegexRule:
+    """
+    Reject samples where any blocklist pattern matches the input or output.
+    """
+
+    def __init__(self, patterns: Iterable[str] = DEFAULT_BLOCKLIST, name: str = "blocklist"):
+        self.name = name
+        self.pattern = re.compile("|".join(f"(?:{p})" for p in patterns))
+
+    def __call__(self, samples: List[Dict[str, Any]]) -> List[bool]:
+        return [
+            not self.pattern.search(_text(s["input"])) and not self.pattern.search(_text(s["output"]))
+            for s in samples
+        ]
+
+
+class PrefilterCascade:
+    """
+    Runs cheap local rules over a batch of samples, cheapest first.
+    Each rule only sees the survivors of the previous one; rejections are counted per rule.
+    """
+
+    def __init__(self, rules: Optional[List[Any]] = None):
+        self.rules = rules if rules is not None else [LengthRule(), PresenceRule(), RegexRule(), LanguageRule()]
+        self.rejections = Counter()
+        self.seen = 0
+        self.passed = 0
+
+    def filter_batch(self, samples: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """
+        Return, for each sample, the name of the rule that rejected it or None if it passed.
+        """
+        verdicts: List[Optional[str]] = [None] * len(samples)
+        alive = list(range(len(samples)))
+        for rule in self.rules:
+            if not alive:
+                break
+            keep = rule([samples[i] for i in alive])
+            survivors = []
+            for i, ok in zip(alive, keep):
+                if ok:
+                    survivors.append(i)
+                else:
+                    verdicts[i] = rule.name
+                    self.rejections[rule.name] += 1
+            alive = survivors
+        self.seen += len(samples)
+        self.passed += len(alive)
+        return verdicts
+
+    def stats(self) -> Dict[str, Any]:
+        return {"seen": self.seen, "passed": self.passed, "rejections": dict(self.rejections)}
+
+
+def build_prefilter(min_input=10, max_input=8000, min_output=1, max_output=16000, languages=None, blocklist=DEFAULT_BLOCKLIST, surrogate=None):
+    """
+    Build the default cascade from plain settings. The language rule only runs when `languages`
+    lists the allowed scripts (e.g. ["latin"]); pass None for `blocklist` to skip that rule.
+    A SurrogateJudge `surrogate` runs last, as the most expensive rule.
+    """
+    rules = [LengthRule(min_input, max_input, min_output, max_output), PresenceRule()]
+    if blocklist:
+        rules.append(RegexRule(blocklist))
+    if languages:
+        rules.append(LanguageRule(languages))
+    if surrogate is not None:
+        rules.append(surrogate)
+    return PrefilterCascade(rules)
@@ -0,0 +1,113 @@
+import re
+import math
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .field_mapping import feature_types
+
+# 常见英文停用词，加上 README 模板和 Hub 标签里几乎每个数据集都有的词
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with you your
+task tasks dataset datasets data given card license format json size categories language languages
+""".split())
+README_CHARS = 20000
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens, with stopwords and single characters removed.
+    """
+    return [token for token in re.findall(r"[a-z0-9]+", text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def dataset_document(dataset_id: str, search_info: Any = None, info: Optional[Dict[str, Any]] = None, readme: str = "") -> str:
+    """
+    Searchable text of a candidate: its id, Hub tags and description, feature names and dataset
+    descriptions from datasets-server `/info`, and the start of its README.
+    """
+    parts = [dataset_id.replace("/", " ")]
+    parts += [str(tag).split(":")[-1] for tag in getattr(search_info, "tags", None) or []]
+    parts.append(getattr(search_info, "description", None) or "")
+    parts += list(feature_types(info))
+    for config_info in ((info or {}).get("dataset_info") or {}).values():
+        parts.append(config_info.get("description") or "")
+    parts.append(readme[:README_CHARS])
+    return "\n".join(parts)
+
+
+class BM25:
+    """
+    Okapi BM25 over a small, fixed set of documents.
+    """
+
+    def __init__(self, documents: Dict[str, List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = {doc_id: Counter(tokens) for doc_id, tokens in documents.items()}
+        self.lengths = {doc_id: len(tokens) for doc_id, tokens in documents.items()}
+        self.avg_length = sum(self.lengths.values()) / max(len(documents), 1) or 1.0
+        document_frequency = Counter(term for counts in self.term_counts.values() for term in counts)
+        total = len(documents)
+        self.idf = {term: math.log(1 + (total - freq + 0.5) / (freq + 0.5)) for term, freq in document_frequency.items()}
+
+    def score(self, query: Iterable[str]) -> Dict[str, float]:
+        terms = set(query)
+        scores = {}
+        for doc_id, counts in self.term_counts.items():
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+            scores[doc_id] = sum(
+                self.idf[term] * counts[term] * (self.k1 + 1) / (counts[term] + norm)
+                for term in terms if term in counts
+            )
+        return scores
+
+
+def select_ranked(scores: Dict[str, float], top_k: Optional[int] = None, min_score: Optional[float] = None) -> List[Tuple[str, float]]:
+    """
+    Candidates sorted by score, cut to `top_k` and to scores of at least `min_score` times the best one.
+    """
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if min_score is not None and ranked:
+        ranked = [(doc_id, score) for doc_id, score in ranked if score >= min_score * ranked[0][1]]
+    return ranked[:top_k] if top_k is not None else ranked
+
+
+async def rank_candidates(
+    pool,
+    client,
+    task_description: str,
+    task_keywords: List[str],
+    top_k: Optional[int] = None,
+    min_score: Optional[float] = None,
+    readme: bool = True,
+    concurrency: int = 8,
+) -> List[Tuple[str, float]]:
+    """
+    Score every candidate of a CandidatePool against the task description and keywords with BM25
+    over its tags, `/info` and (with `readme`) README, and keep the best ones (see select_ranked).
+    Metadata that fails to load just leaves the document shorter.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def load(dataset_id):
+        async with semaphore:
+            info, text = await asyncio.gather(
+                client.get_info(dataset_id),
+                client.get_readme(dataset_id) if readme else asyncio.sleep(0, ""),
+                return_exceptions=True
+            )
+        return dataset_document(
+            dataset_id,
+            pool.candidates[dataset_id]["search_info"],
+            info if isinstance(info, dict) else None,
+            text if isinstance(text, str) else ""
+        )
+
+    documents = await asyncio.gather(*[load(dataset_id) for dataset_id in pool])
+    index = BM25({dataset_id: tokenize(document) for dataset_id, document in zip(pool, documents)})
+    query = tokenize(" ".join([task_description, *map(str, task_keywords)]))
+    ranked = select_ranked(index.score(query), top_k, min_score)
+    logging.info(f"Ranked {len(pool)} candidates, kept {len(ranked)}: " + ", ".join(f"{doc_id} ({score:.2f})" for doc_id, score in ranked))
+    return ranked
@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import math
+import zlib
+import random
+import hashlib
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from ..utils.dedup import normalize_text
+from ..utils.metrics import get_metrics
+
+DEFAULT_DIMS = 1 << 18
+# CJK characters count as one token each since they are not space-separated; ids and paths such as
+# "org/name-v2" stay one token
+_TOKEN_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|\w+(?:[-/.']\w+)*|[^\w\s]")
+
+_judge_log = None
+
+
+class JudgeLog:
+    """
+    Append-only JSONL of LLM judge verdicts: task, sample, scores and whether the sample passed.
+    Unlike the RunJournal it is never truncated, so verdicts accumulate across runs as training
+    data for the surrogate judge.
+    """
+
+    def __init__(self, path: str = os.path.join("hf_logs", "judge_log.jsonl"), max_chars: int = 4000):
+        self.path = path
+        self.max_chars = max_chars
+        self.recorded = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, mode="a", encoding="utf-8")
+
+    def record(self, task_description: str, sample: Dict[str, Any], scores: Dict[str, Any], accepted: bool):
+        entry = {
+            "task": task_description,
+            "sample": {key: str(sample[key])[:self.max_chars] for key in ("input", "output")},
+            "scores": scores,
+            "accepted": accepted,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.recorded += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_judge_log() -> Optional[JudgeLog]:
+    return _judge_log
+
+
+def set_judge_log(judge_log: Optional[JudgeLog]):
+    global _judge_log
+    _judge_log = judge_log
+
+
+def load_judge_examples(paths: Iterable[str], task_description: Optional[str] = None) -> List[Tuple[Dict[str, Any], bool]]:
+    """
+    (sample, accepted) pairs from JudgeLog files (only entries of `task_description` when given)
+    and RunJournal files (rows with both a "sample" and a "scores" result; assumed to be of the same task).
+    A sample seen more than once keeps its last verdict.
+    """
+    examples = {}
+
+    def add(sample, accepted):
+        if sample and sample.get("input") is not None and sample.get("output") is not None:
+            examples[normalize_text(sample["input"])] = (sample, bool(accepted))
+
+    for path in paths:
+        if not os.path.exists(path):
+            logging.warning(f"Judge data {path} not found, skipping")
+            continue
+        journal_samples, journal_verdicts = {}, {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "stage" in entry:
+                    if entry["stage"] == "sample":
+                        journal_samples[entry["key"]] = entry["value"]
+                    elif entry["stage"] == "scores":
+                        journal_verdicts[entry["key"]] = entry["value"] is not None
+                elif task_description is None or entry.get("task") == task_description:
+                    add(entry.get("sample"), entry.get("accepted"))
+        for key, accepted in journal_verdicts.items():
+            add(journal_samples.get(key), accepted)
+    return list(examples.values())
+
+
+def hashed_features(sample: Dict[str, Any], dims: int = DEFAULT_DIMS, max_tokens: int = 512) -> Dict[int, float]:
+    """
+    L2-normalized, sublinear counts of word unigrams and bigrams plus a length bucket for the input and
+    the output of `sample`, hashed into `dims` buckets.
+    """
+    counts = Counter()
+    for field in ("input", "output"):
+        text = normalize_text(sample.get(field, ""))
+        tokens = _TOKEN_PATTERN.findall(text)[:max_tokens]
+        prefix = field[0]
+        counts.update(f"{prefix}:{token}" for token in tokens)
+        counts.update(f"{prefix}:{first} {second}" for first, second in zip(tokens, tokens[1:]))
+        counts[f"{prefix}#len:{int(math.log2(len(text) + 1))}"] += 1
+    features: Dict[int, float] = {}
+    for gram, count in counts.items():
+        index = zlib.crc32(gram.encode("utf-8")) % dims
+        features[index] = features.get(index, 0.0) + 1.0 + math.log(count)
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {index: value / norm for index, value in features.items()}
+
+
+def _sigmoid(z: float) -> float:
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def _in_validation(sample: Dict[str, Any], validation: float) -> bool:
+    # 按输入文本哈希划分，刷新模型时同一样本始终落在同一侧
+    return zlib.crc32(normalize_text(sample["input"]).encode("utf-8")) % 1000 < validation * 1000
+
+
+class SurrogateJudge:
+    """
+    Local stand-in for instruction_judge: logistic regression over hashed n-gram features predicting
+    the probability that the LLM judge accepts a sample.
+    Used as the last PrefilterCascade rule, it rejects samples scoring below `threshold` and lets
+    uncertain and likely-good ones through to the LLM judge. A deterministic `explore` share of the
+    samples it would reject is passed through anyway, so the judge log keeps labels for the region
+    the surrogate filters and later refreshes can correct it.
+    """
+
+    name = "surrogate"
+
+    def __init__(
+        self,
+        weights: Optional[Dict[int, float]] = None,
+        bias: float = 0.0,
+        dims: int = DEFAULT_DIMS,
+        threshold: float = 0.0,
+        explore: float = 0.0,
+        task_description: Optional[str] = None,
+        report: Optional[Dict[str, Any]] = None,
+    ):
+        self.weights = weights or {}
+        self.bias = bias
+        self.dims = dims
+        self.threshold = threshold
+        self.explore = explore
+        self.task_description = task_description
+        self.report = report or {}
+
+    def predict(self, sample: Dict[str, Any]) -> float:
+        features = hashed_features(sample, self.dims)
+        return _sigmoid(self.bias + sum(self.weights.get(index, 0.0) * value for index, value in features.items()))
+
+    def fit(self, examples: List[Tuple[Dict[str, Any], bool]], epochs: int = 3, learning_rate: float = 0.2, l2: float = 1e-6, seed: int = 0):
+        """
+        AdaGrad SGD on the log loss; per-bucket step sizes let rare n-grams learn as fast as common ones.
+        """
+        data = [(hashed_features(sample, self.dims), 1.0 if accepted else 0.0) for sample, accepted in examples]
+        squared = {}
+        bias_squared = 0.0
+        rng = random.Random(seed)
+        for _ in range(epochs):
+            rng.shuffle(data)
+            for features, label in data:
+                z = self.bias + sum(self.weights.get(index, 0.0) * value for index, value in features.items())
+                error = _sigmoid(z) - label
+                bias_squared += error * error
+                self.bias -= learning_rate * error / (math.sqrt(bias_squared) + 1e-9)
+                for index, value in features.items():
+                    weight = self.weights.get(index, 0.0)
+                    gradient = error * value + l2 * weight
+                    squared[index] = squared.get(index, 0.0) + gradient * gradient
+                    self.weights[index] = weight - learning_rate * gradient / (math.sqrt(squared[index]) + 1e-9)
+        return self
+
+    def _explored(self, sample: Dict[str, Any]) -> bool:
+        digest = hashlib.blake2b(normalize_text(sample["input"]).encode("utf-8"), digest_size=4).digest()
+        return int.from_bytes(digest, "little") / 2 ** 32 < self.explore
+
+    def __call__(self, samples: List[Dict[str, Any]]) -> List[bool]:
+        metrics = get_metrics()
+        keep = []
+        for sample in samples:
+            ok = self.predict(sample) >= self.threshold
+            if not ok and self._explored(sample):
+                metrics.incr("surrogate.explored")
+                ok = True
+            keep.append(ok)
+        return keep
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        state = {
+            "task_description": self.task_description,
+            "dims": self.dims,
+            "bias": self.bias,
+            "threshold": self.threshold,
+            "report": self.report,
+            # 只保存非零权重
+            "weights": {str(index): round(weight, 6) for index, weight in self.weights.items() if abs(weight) >= 1e-6},
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, explore: float = 0.0) -> "SurrogateJudge":
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+        return cls(
+            {int(index): weight for index, weight in state["weights"].items()},
+            state["bias"],
+            state["dims"],
+            state["threshold"],
+            explore,
+            state.get("task_description"),
+            state.get("report"),
+        )
+
+
+def roc_auc(probabilities: List[float], labels: List[bool]) -> Optional[float]:
+    """
+    Area under the ROC curve (Mann-Whitney U with tied ranks averaged); None without both classes.
+    """
+    positives = sum(labels)
+    negatives = len(labels) - positives
+    if not positives or not negatives:
+        return None
+    order = sorted(range(len(probabilities)), key=probabilities.__getitem__)
+    rank_sum, i = 0.0, 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and probabilities[order[j + 1]] == probabilities[order[i]]:
+            j += 1
+        rank = (i + j) / 2 + 1
+        rank_sum += rank * sum(1 for k in order[i:j + 1] if labels[k])
+        i = j + 1
+    return (rank_sum - positives * (positives + 1) / 2) / (positives * negatives)
+
+
+def choose_threshold(probabilities: List[float], labels: List[bool], max_loss: float = 0.02, min_positives: int = 20) -> float:
+    """
+    Highest reject threshold that drops at most `max_loss` of the accepted samples; 0 (reject nothing)
+    with fewer than `min_positives` accepted samples to estimate it from.
+    """
+    accepted = sorted(p for p, label in zip(probabilities, labels) if label)
+    if len(accepted) < min_positives:
+        return 0.0
+    return accepted[int(max_loss * len(accepted))]
+
+
+def calibration_report(probabilities: List[float], labels: List[bool], threshold: float, bins: int = 10) -> Dict[str, Any]:
+    """
+    How well predicted acceptance probabilities match the judge on held-out samples: AUC, Brier score,
+    log loss, a reliability table per probability bin and the effect of `threshold` (judge calls
+    saved vs. accepted samples lost).
+    """
+    count = len(labels)
+    if not count:
+        return {"count": 0}
+    positives = sum(labels)
+    rejected = [label for p, label in zip(probabilities, labels) if p < threshold]
+    table = []
+    for b in range(bins):
+        low, high = b / bins, (b + 1) / bins
+        members = [(p, label) for p, label in zip(probabilities, labels) if low <= p < high or (b == bins - 1 and p == 1.0)]
+        if members:
+            table.append({
+                "bin": f"{low:.1f}-{high:.1f}",
+                "count": len(members),
+                "predicted": round(sum(p for p, _ in members) / len(members), 3),
+                "observed": round(sum(label for _, label in members) / len(members), 3),
+            })
+    auc = roc_auc(probabilities, labels)
+    return {
+        "count": count,
+        "acceptance_rate": round(positives / count, 3),
+        "auc": round(auc, 3) if auc is not None else None,
+        "brier": round(sum((p - label) ** 2 for p, label in zip(probabilities, labels)) / count, 4),
+        "log_loss": round(-sum(math.log(min(max(p if label else 1 - p, 1e-12), 1.0)) for p, label in zip(probabilities, labels)) / count, 4),
+        "threshold": round(threshold, 4),
+        "judge_calls_saved": round(len(rejected) / count, 3),
+        "accepted_lost": round(sum(rejected) / positives, 3) if positives else None,
+        "bins": table,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """
+    The calibration report as a plain-text summary and reliability table.
+    """
+    summary = ", ".join(f"{key}={value}" for key, value in report.items() if key != "bins")
+    lines = [summary, f"{'bin':<10}{'count':>8}{'predicted':>12}{'observed':>12}"]
+    for row in report.get("bins", []):
+        lines.append(f"{row['bin']:<10}{row['count']:>8}{row['predicted']:>12.3f}{row['observed']:>12.3f}")
+    return "\n".join(lines)
+
+
+def train_surrogate(
+    examples: List[Tuple[Dict[str, Any], bool]],
+    task_description: Optional[str] = None,
+    dims: int = DEFAULT_DIMS,
+    epochs: int = 3,
+    validation: float = 0.2,
+    max_loss: float = 0.02,
+    seed: int = 0,
+) -> SurrogateJudge:
+    """
+    Fit a SurrogateJudge on judge verdicts, holding out a stable `validation` share of them to pick
+    the reject threshold (see choose_threshold) and to compute the calibration report.
+    """
+    train = [example for example in examples if not _in_validation(example[0], validation)]
+    held_out = [example for example in examples if _in_validation(example[0], validation)]
+    model = SurrogateJudge(dims=dims, task_description=task_description).fit(train, epochs=epochs, seed=seed)
+    probabilities = [model.predict(sample) for sample, _ in held_out]
+    labels = [accepted for _, accepted in held_out]
+    model.threshold = choose_threshold(probabilities, labels, max_loss)
+    model.report = {"train": len(train), **calibration_report(probabilities, labels, model.threshold)}
+    if not model.threshold:
+        logging.warning(f"Too few accepted samples held out ({sum(labels)}) to set a reject threshold; the surrogate will pass every row")
+    return model
+
+
+def surrogate_path(model_dir: str, task_description: str) -> str:
+    digest = hashlib.sha1(task_description.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(model_dir, f"surrogate-{digest}.json")
+
+
+def load_surrogate(model_dir: str, task_description: str, explore: float = 0.05) -> Optional[SurrogateJudge]:
+    """
+    The SurrogateJudge trained for `task_description` under `model_dir`, or None if there is none yet.
+    """
+    path = surrogate_path(model_dir, task_description)
+    if not os.path.exists(path):
+        logging.info(f"No surrogate judge at {path}; every row goes to the LLM judge")
+        return None
+    model = SurrogateJudge.load(path, explore)
+    logging.info(
+        f"Loaded surrogate judge {path}: threshold {model.threshold:.3f}, held-out AUC {model.report.get('auc')}, "
+        f"{model.report.get('judge_calls_saved')} of judge calls saved for {model.report.get('accepted_lost')} of accepted samples lost"
+    )
+    return model
@@ -21,19 +21,19 @@ Given a JSON structure or similar text, your task is to analyze its keys and con
 
 ### Output format:
 Return a JSON object with two keys:
-{
+{{
   "input": "<name of the input field>",
   "output": "<name of the output field>"
-}
+}}
 
 ### Rules:
 1. Choose the field names that most likely correspond to the instruction (input) and answer (output).
 2. Only select from the provided legal keys.
 3. If you cannot identify clear input and output fields, return:
-   {
+   {{
      "input": null,
      "output": null
-   }
+   }}
 4. Do NOT infer or fabricate field names not present in the text.
 5. Only output the field names, not their contents.
 
@@ -42,10 +42,10 @@ Input: "{example_text}"
 Legal Keys: ["question", "answer", "topic"]
 
 Output:
-{
+{{
   "input": "question",
   "output": "answer"
-}
+}}
 
 Input: {row}
 Legal Keys: {legal_keys}
@@ -70,10 +70,10 @@ Your task:
 
 ### Output format
 Return only a JSON object:
-{
+{{
   "input": "<rewritten input>",
   "output": "<rewritten output>"
-}
+}}
 
 ---
 
@@ -145,13 +145,13 @@ You should evaluate the instruction sample across **five criteria**, using the d
 
 Return your evaluation in strict **JSON** format as follows:
 
-{
+{{
   "Relevance": "<0–10>",
   "Correctness": "<0–10>",
   "Helpfulness": "<0–10>",
   "Clarity": "<0–10>",
   "Difficulty": "<0–10>"
-}
+}}
 
 ---
 
@@ -197,10 +197,10 @@ Generate a **single** input-output pair based on the following description and f
 2. The **input** should follow the input format and represent a valid instruction or question for this task.
 3. The **output** should follow the output format and be a correct, helpful, and complete response to the input.
 4. Return only the final JSON object in this format:
-{
+{{
   "input": "<generated input>",
   "output": "<generated output>"
-}
+}}
 
 ---
 
@@ -235,12 +235,120 @@ Generate a **single** input-output pair based on the task description and few-sh
 3. Keep **semantic consistency** with the task, but introduce diversity in topic, difficulty, or structure.
 4. The input and output must both follow the described formats.
 5. Return only the final JSON object in this format:
-{
+{{
   "input": "<generated input>",
   "output": "<generated output>"
-}
+}}
 
 ---
 
 Now generate one example:
 """
+
+
+INSTRUCTION_JUDGE_BATCH_PROMPT = """You are an expert LLM evaluator for instruction-tuning datasets. Your goal is to assess how helpful and appropriate each instruction sample is for training a model on a specific task.
+You will be given:
+1. A **Task Definition** – describing the target task the model should learn.
+2. A list of {count} **Instruction Samples**, each with a numeric id, containing an example instruction (and optionally a response).
+
+Evaluate EACH instruction sample independently across **five criteria**, each scored 0–10:
+
+1. **Relevance** – how well the sample aligns with the task definition and objectives (0 = off-task, 10 = perfectly aligned).
+2. **Correctness** – whether the response is factually accurate and logically valid (0 = incorrect, 10 = fully correct). If no response is provided, judge the expected answer type and structure.
+3. **Helpfulness** – whether the response is complete, informative and useful (0 = useless, 10 = comprehensive and valuable for learning).
+4. **Clarity** – whether the instruction is easy to understand and unambiguous (0 = confusing, 10 = perfectly clear).
+5. **Difficulty** – how appropriately challenging the pair is for the target task (0 = trivial or overly complex, 10 = ideal difficulty).
+
+---
+
+### Output Format
+
+Return a strict **JSON array** with exactly one object per sample, in the same order, each carrying the sample id:
+
+[
+  {{"id": 0, "Relevance": "<0–10>", "Correctness": "<0–10>", "Helpfulness": "<0–10>", "Clarity": "<0–10>", "Difficulty": "<0–10>"}},
+  ...
+]
+
+---
+
+### Inputs
+
+**Task Definition:**  
+{task_description}
+
+**Instruction Samples:**  
+{instruction_samples}
+
+---
+
+### Output
+"""
+
+FORMAT_CONVERSION_BATCH_PROMPT = """You are a format conversion assistant that rewrites given input-output pairs from one format to another.
+
+### Task
+You are given {count} samples, each with a numeric id, an **Original Input** and an **Original Output**, plus the target formats:
+- **Input Format:** description of how the input should be formatted after conversion.
+- **Output Format:** description of how the output should be formatted after conversion.
+
+Your task, for EACH sample independently:
+- Rewrite BOTH the input and output according to the new format.
+- Preserve the original content and meaning of the input and output.
+- Follow the target format conventions strictly (tone, structure, delimiters, etc.).
+- Do not add explanations, only provide the final formatted content.
+
+### Output format
+Return only a JSON array with exactly one object per sample, in the same order, each carrying the sample id:
+[
+  {{"id": 0, "input": "<rewritten input>", "output": "<rewritten output>"}},
+  ...
+]
+
+---
+
+Input Format:
+{input_format}
+
+Output Format:
+{output_format}
+
+Samples:
+{samples}
+
+Return:
+"""
+
+DATA_GENERATOR_BATCH_PROMPT = """You are a data generation assistant that creates diverse, realistic, and high-quality instruction data for fine-tuning large language models.
+
+### Task
+Generate **{count}** distinct input-output pairs based on the task description and format rules below.
+
+---
+
+**Task Description:**
+{task_description}
+
+**Input Format:**
+{input_format}
+
+**Output Format:**
+{output_format}
+{example_section}
+---
+
+### Requirements:
+1. Every pair must be **original**, **plausible**, and consistent with the task description; do not copy or paraphrase the examples.
+2. The pairs must differ from each other in topic, difficulty, or structure — no two may be near-duplicates.
+3. Each **input** should follow the input format and represent a valid instruction or question for this task.
+4. Each **output** should follow the output format and be a correct, helpful, and complete response to its input.
+5. Return only a JSON array with exactly {count} objects in this format:
+[
+  {{"input": "<generated input>", "output": "<generated output>"}},
+  ...
+]
+
+---
+
+Now generate {count} examples:
+"""
@@ -0,0 +1,163 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Hashable, Mapping, Optional
+
+from .metrics import get_metrics
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Seconds to wait according to `retry-after-ms` / `Retry-After` (delta-seconds or HTTP date).
+    Returns None when the headers carry no usable hint.
+    """
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(0.0, float(value) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on in-flight requests.
+    Each success while the limit is in use adds `increase / limit` (about +`increase` per round trip);
+    an overload signal (429/5xx) or a latency spike multiplies the limit by `decrease`, at most once per round trip.
+    A Retry-After hint pauses new requests until it expires.
+    With `adaptive=False` it behaves as a fixed semaphore of `max_limit`.
+    """
+
+    def __init__(
+        self,
+        initial: Optional[int] = None,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        adaptive: bool = True,
+        name: str = "llm",
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.adaptive = adaptive
+        self.name = name
+        self.limit = float(max_limit if not adaptive or initial is None else min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._baseline: Dict[Hashable, float] = {}  # slow EWMA per call kind: latency when healthy
+        self._recent: Dict[Hashable, float] = {}  # fast EWMA per call kind: current latency
+        self._round_trip = 0.0
+        self._last_decrease = 0.0
+        self._paused_until = 0.0
+        self._condition = None
+        self._loop = None
+        get_metrics().set_gauge(f"{self.name}.concurrency_limit", int(self.limit))
+
+    def _ensure_condition(self) -> asyncio.Condition:
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._loop is not loop:
+            self._condition = asyncio.Condition()
+            self._loop = loop
+        return self._condition
+
+    async def acquire(self):
+        condition = self._ensure_condition()
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            async with condition:
+                if self._paused_until > time.monotonic():
+                    continue
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                await condition.wait()
+
+    async def release(self):
+        condition = self._ensure_condition()
+        async with condition:
+            self.in_flight -= 1
+            condition.notify_all()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release()
+
+    def _set_limit(self, limit: float):
+        self.limit = min(max(limit, self.min_limit), self.max_limit)
+        get_metrics().set_gauge(f"{self.name}.concurrency_limit", int(self.limit))
+
+    def _backoff(self, now: float):
+        # 同一轮往返内的多次过载只算一次
+        if now - self._last_decrease < self._round_trip:
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        get_metrics().incr(f"{self.name}.limit_decreases")
+        self._set_limit(self.limit * self.decrease)
+
+    def on_success(self, latency: float, kind: Hashable = None):
+        """
+        Record a healthy response that took `latency` seconds.
+        Latency is compared against the history of the same `kind` of call, since e.g. short judge
+        calls and long conversions have very different normal latencies.
+        """
+        if not self.adaptive:
+            return
+        recent = self._recent.get(kind, latency)
+        recent = self._recent[kind] = 0.7 * recent + 0.3 * latency
+        baseline = self._baseline.get(kind, latency)
+        baseline = self._baseline[kind] = 0.98 * baseline + 0.02 * min(latency, recent)
+        self._round_trip = 0.9 * self._round_trip + 0.1 * latency if self._round_trip else latency
+        if recent > self.latency_tolerance * baseline:
+            self._backoff(time.monotonic())
+            return
+        # Only grow while the current limit is actually being used
+        if self.in_flight >= int(self.limit) - 1 and self.limit < self.max_limit:
+            self.increases += 1
+            self._set_limit(self.limit + self.increase / self.limit)
+
+    def on_overload(self, retry_after: Optional[float] = None):
+        """
+        Record a 429/5xx response; `retry_after` pauses new requests for that many seconds.
+        """
+        now = time.monotonic()
+        get_metrics().incr(f"{self.name}.overloaded")
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+        if self.adaptive:
+            self._backoff(now)
+
+    def stats(self):
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
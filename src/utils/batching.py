@@ -0,0 +1,85 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+from .prompt_budget import count_tokens
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into batched calls.
+    A batch is flushed when it reaches `max_batch_size`, when the next item would exceed
+    `token_budget`, or `max_wait` seconds after its first item arrived.
+    Items whose caller was cancelled before the flush (e.g. a discarded speculative conversion) are
+    dropped from the batch and counted in `dropped`; once sent, a batch is paid for in full.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 8,
+        token_budget: Optional[int] = None,
+        max_wait: float = 0.2,
+        size_fn: Callable[[Any], int] = count_tokens,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.token_budget = token_budget
+        self.max_wait = max_wait
+        self.size_fn = size_fn
+        self.batches = 0
+        self.items = 0
+        self.dropped = 0
+        self._pending = []
+        self._pending_tokens = 0
+        self._timer = None
+        self._running = set()
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queue one item and wait for its result from the batch it ends up in.
+        """
+        future = asyncio.get_running_loop().create_future()
+        tokens = self.size_fn(item)
+        if self._pending and self.token_budget is not None and self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+        self._pending.append((item, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        live = [(item, future) for item, future in batch if not future.cancelled()]
+        self.dropped += len(batch) - len(live)
+        if not live:
+            return
+        task = asyncio.ensure_future(self._run(live))
+        # Hold a reference so the batch task isn't garbage collected mid-flight
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        # A batch_fn returning fewer results than items must not leave callers waiting forever
+        for _, future in batch[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError(f"Batch returned {len(results)} results for {len(batch)} items"))
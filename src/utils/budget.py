@@ -0,0 +1,100 @@
+import random
+from typing import Dict, Hashable, Iterable, Optional
+
+from .metrics import get_metrics
+
+
+class SpendBudget:
+    """
+    Global limit on LLM spend for one run, read from the llm.* metrics counters.
+    Any of `max_calls`, `max_tokens` (prompt + completion) and `max_cost` may be set; cost is computed
+    from per-1k-token prices. Cached responses cost nothing since they never reach the counters.
+    """
+
+    def __init__(
+        self,
+        max_calls: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        price_per_1k_prompt: float = 0.0,
+        price_per_1k_completion: float = 0.0,
+    ):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_cost = max_cost
+        self.price_per_1k_prompt = price_per_1k_prompt
+        self.price_per_1k_completion = price_per_1k_completion
+        self._start = self._snapshot()
+
+    @staticmethod
+    def _snapshot() -> Dict[str, float]:
+        counters = get_metrics().counters
+        return {name: counters.get(f"llm.{name}", 0) for name in ("requests", "prompt_tokens", "completion_tokens")}
+
+    def spent(self) -> Dict[str, float]:
+        now = self._snapshot()
+        used = {name: now[name] - self._start[name] for name in now}
+        return {
+            "calls": int(used["requests"]),
+            "tokens": int(used["prompt_tokens"] + used["completion_tokens"]),
+            "cost": round(
+                used["prompt_tokens"] / 1000 * self.price_per_1k_prompt
+                + used["completion_tokens"] / 1000 * self.price_per_1k_completion, 6
+            ),
+        }
+
+    def exhausted(self) -> bool:
+        spent = self.spent()
+        return (
+            (self.max_calls is not None and spent["calls"] >= self.max_calls)
+            or (self.max_tokens is not None and spent["tokens"] >= self.max_tokens)
+            or (self.max_cost is not None and spent["cost"] >= self.max_cost)
+        )
+
+
+class ThompsonAllocator:
+    """
+    Thompson sampling over arms (datasets) with Bernoulli rewards (row accepted or not).
+    Each choice draws from every open arm's Beta(prior + accepted, prior + rejected) posterior
+    and picks the highest draw, so arms with a proven acceptance rate get most of the rows
+    while uncertain ones are still tried. Closed arms (out of rows) are never chosen.
+    """
+
+    def __init__(self, arms: Iterable[Hashable], prior_accepted: float = 1.0, prior_rejected: float = 1.0, seed: int = 0):
+        self.prior_accepted = prior_accepted
+        self.prior_rejected = prior_rejected
+        self.accepted: Dict[Hashable, int] = {arm: 0 for arm in arms}
+        self.rejected: Dict[Hashable, int] = {arm: 0 for arm in self.accepted}
+        self.pulls: Dict[Hashable, int] = {arm: 0 for arm in self.accepted}
+        self.open = set(self.accepted)
+        self._rng = random.Random(seed)
+
+    def choose(self) -> Optional[Hashable]:
+        """
+        The arm to draw the next row from, or None once every arm is closed.
+        """
+        if not self.open:
+            return None
+        # Draw in insertion order, not set order, so `seed` reproduces a run regardless of PYTHONHASHSEED
+        draws = {
+            arm: self._rng.betavariate(self.prior_accepted + self.accepted[arm], self.prior_rejected + self.rejected[arm])
+            for arm in self.accepted if arm in self.open
+        }
+        arm = max(draws, key=draws.get)
+        self.pulls[arm] += 1
+        return arm
+
+    def record(self, arm: Hashable, accepted: bool):
+        if accepted:
+            self.accepted[arm] += 1
+        else:
+            self.rejected[arm] += 1
+
+    def close(self, arm: Hashable):
+        self.open.discard(arm)
+
+    def stats(self) -> Dict[Hashable, Dict[str, int]]:
+        return {
+            arm: {"pulls": self.pulls[arm], "accepted": self.accepted[arm], "rejected": self.rejected[arm]}
+            for arm in self.accepted
+        }
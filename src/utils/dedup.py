@@ -0,0 +1,159 @@
+import os
+import re
+import array
+import sqlite3
+import hashlib
+import threading
+from typing import List, Optional, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_text(text) -> str:
+    return re.sub(r"\s+", " ", str(text).lower()).strip()
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows <= num_perm whose LSH S-curve midpoint is closest to `threshold`.
+    """
+    best = (1, num_perm)
+    best_error = float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class NearDuplicateIndex:
+    """
+    Exact + MinHash/LSH duplicate detector backed by SQLite.
+    Texts are normalized, shingled into character n-grams and compared by estimated Jaccard similarity.
+    Like RunJournal, the index starts empty unless `resume` is set: it belongs to one run's results.
+    Entries remember the key of the row that added them, so a row re-seen on a resumed run is not its own duplicate.
+    Only the first `max_chars` normalized characters are shingled; exact matching uses the whole text.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = os.path.join("hf_logs", "dedup_index.sqlite"),
+        threshold: float = 0.85,
+        num_perm: int = 64,
+        shingle_size: int = 5,
+        seed: int = 1,
+        resume: bool = False,
+        max_chars: int = 4000,
+    ):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_chars = max_chars
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self._lock = threading.Lock()
+
+        # Stable permutations (a * x + b) mod p, derived from the seed
+        self._perms = []
+        for i in range(num_perm):
+            a = _hash64(f"{seed}:a:{i}".encode()) % (_MERSENNE_PRIME - 1) + 1
+            b = _hash64(f"{seed}:b:{i}".encode()) % _MERSENNE_PRIME
+            self._perms.append((a, b))
+
+        path = path or ":memory:"
+        if path != ":memory:":
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Entries of an earlier run would reject rows whose accepted copies are no longer in the results
+            if not resume and os.path.exists(path):
+                os.remove(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS exact (hash TEXT PRIMARY KEY, key TEXT);
+            CREATE TABLE IF NOT EXISTS signatures (id INTEGER PRIMARY KEY, key TEXT, signature BLOB);
+            CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket TEXT, signature_id INTEGER);
+            CREATE INDEX IF NOT EXISTS idx_buckets ON buckets(band, bucket);
+            """
+        )
+        self._conn.commit()
+
+    def _shingles(self, text: str) -> set:
+        if len(text) <= self.shingle_size:
+            return {text}
+        return {text[i:i + self.shingle_size] for i in range(len(text) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> List[int]:
+        hashes = [_hash64(shingle.encode("utf-8")) for shingle in self._shingles(text)]
+        return [
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        ]
+
+    def _band_buckets(self, signature: List[int]):
+        for band in range(self.bands):
+            chunk = signature[band * self.rows:(band + 1) * self.rows]
+            yield band, hashlib.blake2b(array.array("Q", chunk).tobytes(), digest_size=8).hexdigest()
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+    def check_and_add(self, text, key: str) -> Optional[str]:
+        """
+        Return the key of an existing duplicate of `text`, or index `text` under `key` and return None.
+        CPU-bound and blocking: async callers should run it in a thread (asyncio.to_thread); the SQLite
+        connection is shared under a lock.
+        """
+        normalized = normalize_text(text)
+        exact_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        # The signature only reads the permutations, so it is computed outside the lock
+        signature = self.signature(normalized[:self.max_chars])
+        buckets = list(self._band_buckets(signature))
+        with self._lock:
+            row = self._conn.execute("SELECT key FROM exact WHERE hash = ?", (exact_hash,)).fetchone()
+            if row is not None:
+                if row[0] == key:
+                    return None
+                self.exact_duplicates += 1
+                return row[0]
+
+            candidates = set()
+            for band, bucket in buckets:
+                candidates.update(
+                    r[0] for r in self._conn.execute(
+                        "SELECT signature_id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                    )
+                )
+            for signature_id in candidates:
+                other_key, blob = self._conn.execute(
+                    "SELECT key, signature FROM signatures WHERE id = ?", (signature_id,)
+                ).fetchone()
+                if other_key != key and self.similarity(signature, array.array("Q", blob).tolist()) >= self.threshold:
+                    self.near_duplicates += 1
+                    return other_key
+
+            self._conn.execute("INSERT OR IGNORE INTO exact (hash, key) VALUES (?, ?)", (exact_hash, key))
+            cursor = self._conn.execute(
+                "INSERT INTO signatures (key, signature) VALUES (?, ?)", (key, array.array("Q", signature).tobytes())
+            )
+            self._conn.executemany(
+                "INSERT INTO buckets (band, bucket, signature_id) VALUES (?, ?, ?)",
+                [(band, bucket, cursor.lastrowid) for band, bucket in buckets]
+            )
+            self._conn.commit()
+            return None
+
+    def stats(self):
+        return {"exact_duplicates": self.exact_duplicates, "near_duplicates": self.near_duplicates}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,146 @@
+import os
+import time
+import json
+import pickle
+import sqlite3
+import hashlib
+import threading
+from collections import namedtuple
+from typing import Optional, Dict, Any, Callable
+
+
+CacheEntry = namedtuple("CacheEntry", ["value", "etag", "last_modified", "fetched_at", "fresh"])
+
+
+class CacheMiss(LookupError):
+    """
+    Raised in offline mode when a request has no cached response.
+    """
+
+
+class MetadataCache:
+    """
+    Persistent cache for Hub and datasets-server responses backed by SQLite.
+    Entries are keyed by endpoint and params, expire per endpoint and keep
+    ETag/Last-Modified validators so stale entries can be revalidated cheaply.
+    """
+
+    DEFAULT_TTLS = {
+        "search": 24 * 3600,
+        "readme": 7 * 24 * 3600,
+        "info": 7 * 24 * 3600,
+        "splits": 7 * 24 * 3600,
+        "first-rows": 7 * 24 * 3600,
+        "rows": 7 * 24 * 3600,
+        "parquet": 7 * 24 * 3600,
+    }
+
+    def __init__(
+        self,
+        path: str = os.path.join("hf_logs", "hf_cache.sqlite"),
+        ttls: Optional[Dict[str, float]] = None,
+        offline: bool = False,
+    ):
+        self.path = path
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT,
+                params TEXT,
+                value BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL
+            )
+            """
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([endpoint, params], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, endpoint: str, params: Dict[str, Any]) -> Optional[CacheEntry]:
+        key = self.make_key(endpoint, params)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        ttl = self.ttls.get(endpoint)
+        fresh = ttl is None or time.time() - row[3] <= ttl
+        if fresh:
+            self.hits += 1
+        return CacheEntry(pickle.loads(row[0]), row[1], row[2], row[3], fresh)
+
+    def store(self, endpoint: str, params: Dict[str, Any], value: Any, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        key = self.make_key(endpoint, params)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, endpoint, params, value, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint, json.dumps(params, sort_keys=True), pickle.dumps(value), etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    def refresh(self, endpoint: str, params: Dict[str, Any]):
+        """
+        Mark an entry as fresh again after the server answered 304 Not Modified.
+        """
+        self.revalidated += 1
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), self.make_key(endpoint, params))
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def revalidation_headers(entry: Optional[CacheEntry]) -> Dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def serve_offline(self, endpoint: str, params: Dict[str, Any], entry: Optional[CacheEntry]) -> Any:
+        """
+        Return whatever is cached, stale or not, or raise CacheMiss.
+        """
+        if entry is None:
+            raise CacheMiss(f"No cached response for {endpoint} {params} in offline mode")
+        return entry.value
+
+    def get_or_fetch(self, endpoint: str, params: Dict[str, Any], fetch: Callable[[], Any]) -> Any:
+        """
+        Cache wrapper for calls that have no HTTP validators, such as Hub searches.
+        """
+        entry = self.lookup(endpoint, params)
+        if entry is not None and entry.fresh:
+            return entry.value
+        if self.offline:
+            return self.serve_offline(endpoint, params, entry)
+        value = fetch()
+        self.store(endpoint, params, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
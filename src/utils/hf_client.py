@@ -1,16 +1,87 @@
+import asyncio
+import logging
+from collections import deque
+from itertools import islice
+from urllib.parse import unquote, urlparse
+
+import httpx
 import requests
 from huggingface_hub import HfApi, hf_hub_download
-from typing import Optional, List, Dict, Any
+from huggingface_hub.utils import build_hf_headers
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet row streaming is optional
+    pa = pq = None
+
+from .rate_limit import RateLimiter
+from .hf_cache import MetadataCache
+from .metrics import get_metrics
+from .retry import Hedge, RetryPolicy
+from .row_sampling import plan_windows, sample_row_indices
+
+PARQUET_REVISION = "refs/convert/parquet"
+# 读取 Parquet 文件尾部元数据时第一次请求的字节数，通常足以覆盖整个 footer
+PARQUET_FOOTER_PROBE = 64 * 1024
 
 class HFClient:
     """
     A simple wrapper client for interacting with Hugging Face datasets and metadata.
+    Responses are served from `cache` when a MetadataCache is configured.
+    `endpoint` (Hub) and `base_url` (datasets-server) can point at a mirror or a local mock.
+    Transient failures (connection errors, 429, 5xx) are retried under `retry`.
     """
 
     BASE_URL = "https://datasets-server.huggingface.co"
 
-    def __init__(self, hf_token):
-        self.api = HfApi(token=hf_token)
+    def __init__(
+        self,
+        hf_token,
+        cache: Optional[MetadataCache] = None,
+        endpoint: Optional[str] = None,
+        base_url: Optional[str] = None,
+        retry: Optional[RetryPolicy] = None,
+        timeout: float = 60.0,
+    ):
+        self.api = HfApi(endpoint=endpoint, token=hf_token)
+        self.cache = cache
+        self.endpoint = endpoint
+        self.base_url = base_url or self.BASE_URL
+        self.retry = retry or RetryPolicy(max_attempts=3, name="hf")
+        self.timeout = timeout
+
+    def _request(self, endpoint: str, params: Dict[str, Any], headers: Dict[str, str]) -> requests.Response:
+        with get_metrics().span(f"hf.{endpoint}"):
+            resp = requests.get(f"{self.base_url}/{endpoint}", params=params, headers=headers, timeout=self.timeout)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+        return resp
+
+    def _get_json(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        metrics = get_metrics()
+        if self.cache is None:
+            resp = self.retry.call_sync(lambda: self._request(endpoint, params, {}))
+            return resp.json()
+
+        entry = self.cache.lookup(endpoint, params)
+        if entry is not None and entry.fresh:
+            metrics.incr("hf.cache_hits")
+            return entry.value
+        if self.cache.offline:
+            return self.cache.serve_offline(endpoint, params, entry)
+
+        headers = self.cache.revalidation_headers(entry)
+        resp = self.retry.call_sync(lambda: self._request(endpoint, params, headers))
+        if resp.status_code == 304 and entry is not None:
+            metrics.incr("hf.revalidated")
+            self.cache.refresh(endpoint, params)
+            return entry.value
+        resp.raise_for_status()
+        value = resp.json()
+        self.cache.store(endpoint, params, value, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return value
 
     # -------------------------------
     # Dataset Search & Metadata
@@ -19,27 +90,42 @@ class HFClient:
         """
         Search for datasets on Hugging Face Hub by query keyword.
         Results are filtered to JSON datasets and sorted by downloads.
+        Only the first `limit` results are requested; the paginated iterator is not drained.
         """
-        datasets = list(
-            self.api.list_datasets(
-                search=query,
-                filter="format:json",
-                sort="downloads"
-            )
-        )[:limit]
-        return datasets
+        def fetch():
+            return self.retry.call_sync(lambda: list(islice(
+                self.api.list_datasets(
+                    search=query,
+                    filter="format:json",
+                    sort="downloads",
+                    limit=limit
+                ),
+                limit
+            )))
+
+        with get_metrics().span("hf.search"):
+            if self.cache is None:
+                return fetch()
+            return self.cache.get_or_fetch("search", {"query": query, "limit": limit}, fetch)
 
     def get_readme(self, repo_id: str, repo_type: str = "dataset") -> str:
         """
         Download and return the README.md content of a dataset repository.
         """
-        readme_path = hf_hub_download(
-            repo_id=repo_id,
-            repo_type=repo_type,
-            filename="README.md"
-        )
-        with open(readme_path, encoding="utf-8") as f:
-            return f.read()
+        def fetch():
+            readme_path = self.retry.call_sync(lambda: hf_hub_download(
+                repo_id=repo_id,
+                repo_type=repo_type,
+                filename="README.md",
+                endpoint=self.endpoint
+            ))
+            with open(readme_path, encoding="utf-8") as f:
+                return f.read()
+
+        with get_metrics().span("hf.readme"):
+            if self.cache is None:
+                return fetch()
+            return self.cache.get_or_fetch("readme", {"repo_id": repo_id, "repo_type": repo_type}, fetch)
 
     # -------------------------------
     # Dataset Server Endpoints
@@ -48,14 +134,10 @@ class HFClient:
         """
         Retrieve the available splits (train/test/validation) of a dataset.
         """
-        url = f"{self.BASE_URL}/splits"
         params = {"dataset": dataset}
         if config:
             params["config"] = config
-
-        resp = requests.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
+        return self._get_json("splits", params)
 
     def get_first_rows(
         self,
@@ -66,23 +148,416 @@ class HFClient:
         """
         Get the first few rows of a dataset split.
         """
-        url = f"{self.BASE_URL}/first-rows"
         params = {"dataset": dataset, "split": split, "config": config}
-
-        resp = requests.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
+        return self._get_json("first-rows", params)
 
     def get_info(self, dataset: str, config: Optional[str] = None) -> Dict[str, Any]:
         """
         Retrieve dataset information and metadata.
         """
-        url = f"{self.BASE_URL}/info"
         params = {"dataset": dataset}
         if config:
             params["config"] = config
+        return self._get_json("info", params)
 
-        resp = requests.get(url, params=params)
-        resp.raise_for_status()
-        return resp.json()
 
+class AsyncHFClient:
+    """
+    Async counterpart of HFClient sharing one keep-alive HTTP session.
+    Requests are bounded by a per-host concurrency limit and an optional per-host RPM limit.
+    With `hedge`, a request slower than the p95 latency of its endpoint gets a duplicate and the first reply wins.
+    """
+
+    BASE_URL = HFClient.BASE_URL
+
+    def __init__(
+        self,
+        hf_token,
+        max_concurrency_per_host: int = 8,
+        rpm_per_host: Optional[int] = None,
+        timeout: float = 60.0,
+        cache: Optional[MetadataCache] = None,
+        endpoint: Optional[str] = None,
+        base_url: Optional[str] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedge: bool = False,
+    ):
+        self.sync_client = HFClient(hf_token=hf_token, cache=cache, endpoint=endpoint, base_url=base_url, retry=retry, timeout=timeout)
+        self.cache = cache
+        self.base_url = self.sync_client.base_url
+        self.retry = self.sync_client.retry
+        self.hedge = hedge
+        self._hedges = {}
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.rpm_per_host = rpm_per_host
+        self.timeout = timeout
+        self._session = None
+        self._loop = None
+        self._host_limits = {}
+        self._closing = set()
+
+    def _ensure_session(self) -> httpx.AsyncClient:
+        # The session and per-host semaphores are bound to the running event loop
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop:
+            if self._session is not None:
+                logging.info("AsyncHFClient used from a new event loop; closing the previous HTTP session")
+                self._close_stale_session(self._session, self._loop)
+            self._session = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=self.max_concurrency_per_host),
+            )
+            self._host_limits = {}
+            self._loop = loop
+        return self._session
+
+    def _close_stale_session(self, session: httpx.AsyncClient, old_loop: asyncio.AbstractEventLoop):
+        if old_loop.is_running():
+            # Still running in another thread: close the connections on the loop that owns them
+            closing = asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._aclose_quietly(session), old_loop))
+        else:
+            closing = asyncio.get_running_loop().create_task(self._aclose_quietly(session))
+        self._closing.add(closing)
+        closing.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose_quietly(session: httpx.AsyncClient):
+        try:
+            await session.aclose()
+        except Exception as e:
+            # Transports of a closed loop cannot be shut down from here; their sockets go with the session
+            logging.debug(f"Closing the previous HTTP session failed: {e!r}")
+
+    def _host_limit(self, url: str):
+        host = urlparse(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = (
+                asyncio.Semaphore(self.max_concurrency_per_host),
+                RateLimiter(rpm=self.rpm_per_host),
+            )
+        return self._host_limits[host]
+
+    async def _get_json(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        metrics = get_metrics()
+        entry = None
+        if self.cache is not None:
+            entry = self.cache.lookup(endpoint, params)
+            if entry is not None and entry.fresh:
+                metrics.incr("hf.cache_hits")
+                return entry.value
+            if self.cache.offline:
+                return self.cache.serve_offline(endpoint, params, entry)
+
+        headers = MetadataCache.revalidation_headers(entry)
+
+        def attempt(started=None):
+            return self._request(endpoint, params, headers, started)
+
+        if self.hedge:
+            hedge = self._hedges.setdefault(endpoint, Hedge(f"hf.{endpoint}"))
+            resp = await self.retry.call(lambda: hedge.call(attempt))
+        else:
+            resp = await self.retry.call(attempt)
+
+        if self.cache is None:
+            return resp.json()
+        if resp.status_code == 304 and entry is not None:
+            metrics.incr("hf.revalidated")
+            self.cache.refresh(endpoint, params)
+            return entry.value
+        value = resp.json()
+        self.cache.store(endpoint, params, value, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        return value
+
+    async def _request(self, endpoint: str, params: Dict[str, Any], headers: Dict[str, str], started: Optional[asyncio.Event] = None) -> httpx.Response:
+        url = f"{self.base_url}/{endpoint}"
+        session = self._ensure_session()
+        semaphore, limiter = self._host_limit(url)
+        async with semaphore:
+            await limiter.acquire()
+            if started is not None:
+                started.set()
+            with get_metrics().span(f"hf.{endpoint}"):
+                resp = await session.get(url, params=params, headers=headers)
+        if resp.status_code != 304:
+            resp.raise_for_status()
+        return resp
+
+    # -------------------------------
+    # Dataset Search & Metadata
+    # -------------------------------
+    async def search_datasets(self, query: str, limit: int = 5) -> List[Any]:
+        """
+        Search for datasets on Hugging Face Hub by query keyword.
+        The blocking Hub call runs in a worker thread so the event loop keeps going.
+        """
+        return await asyncio.to_thread(self.sync_client.search_datasets, query, limit)
+
+    async def get_readme(self, repo_id: str, repo_type: str = "dataset") -> str:
+        """
+        Download and return the README.md content of a dataset repository.
+        """
+        return await asyncio.to_thread(self.sync_client.get_readme, repo_id, repo_type)
+
+    # -------------------------------
+    # Dataset Server Endpoints
+    # -------------------------------
+    async def get_splits(self, dataset: str, config: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retrieve the available splits (train/test/validation) of a dataset.
+        """
+        params = {"dataset": dataset}
+        if config:
+            params["config"] = config
+        return await self._get_json("splits", params)
+
+    async def get_first_rows(
+        self,
+        dataset: str,
+        split: str = "train",
+        config: str = "default"
+    ) -> Dict[str, Any]:
+        """
+        Get the first few rows of a dataset split.
+        """
+        params = {"dataset": dataset, "split": split, "config": config}
+        return await self._get_json("first-rows", params)
+
+    async def get_info(self, dataset: str, config: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retrieve dataset information and metadata.
+        """
+        params = {"dataset": dataset}
+        if config:
+            params["config"] = config
+        return await self._get_json("info", params)
+
+    async def get_rows(
+        self,
+        dataset: str,
+        split: str = "train",
+        config: str = "default",
+        offset: int = 0,
+        length: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Get `length` (at most 100) rows of a dataset split starting at `offset`.
+        """
+        params = {"dataset": dataset, "config": config, "split": split, "offset": offset, "length": length}
+        return await self._get_json("rows", params)
+
+    async def get_parquet_files(self, dataset: str, config: Optional[str] = None, split: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        List the auto-converted Parquet files of a dataset, optionally for one config/split.
+        """
+        files = (await self._get_json("parquet", {"dataset": dataset}))["parquet_files"]
+        return [
+            f for f in files
+            if (config is None or f["config"] == config) and (split is None or f["split"] == split)
+        ]
+
+    # -------------------------------
+    # Row Streaming
+    # -------------------------------
+    async def _resolve_split(self, dataset: str, config: Optional[str], split: Optional[str]) -> Tuple[str, str]:
+        if config is not None and split is not None:
+            return config, split
+        splits = (await self.get_splits(dataset))["splits"]
+        for candidate in splits:
+            if (config is None or candidate.get("config") == config) and (split is None or candidate["split"] == split):
+                return candidate.get("config", "default"), candidate["split"]
+        raise LookupError(f"No split {split!r} in config {config!r} of {dataset}")
+
+    async def _row_count(self, dataset: str, config: str, split: str) -> int:
+        # info 里通常有行数；没有时用一次 length=1 的 /rows 请求拿 num_rows_total
+        try:
+            info = (await self.get_info(dataset, config))["dataset_info"]
+            info = info.get(config, info)
+            return info["splits"][split]["num_examples"]
+        except (KeyError, TypeError, httpx.HTTPStatusError):
+            return (await self.get_rows(dataset, split, config, 0, 1))["num_rows_total"]
+
+    async def iter_rows(
+        self,
+        dataset: str,
+        max_rows: int = 100,
+        config: Optional[str] = None,
+        split: Optional[str] = None,
+        mode: str = "head",
+        seed: int = 0,
+        strata: int = 10,
+        page_size: int = 100,
+        prefetch: int = 4,
+        source: str = "rows",
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream up to `max_rows` rows ({"row_idx", "row"}) of one split, in row order.
+        `mode` is "head", "random" or "stratified" (see sample_row_indices), seeded by `seed`.
+        Rows come from the /rows endpoint, `prefetch` pages at a time, or with `source="parquet"`
+        from the auto-converted Parquet files (needs pyarrow); row counts then come from the remote
+        footers and only the files holding sampled rows are downloaded.
+        Without `config`/`split` the first split listed by /splits is used.
+        """
+        config, split = await self._resolve_split(dataset, config, split)
+        if source == "parquet":
+            async for row in self._iter_parquet_rows(dataset, config, split, max_rows, mode, seed, strata, prefetch):
+                yield row
+            return
+
+        total = None if mode == "head" else await self._row_count(dataset, config, split)
+        indices = sample_row_indices(total, max_rows, mode, seed, strata)
+        wanted = set(indices)
+        windows = deque(plan_windows(indices, min(page_size, 100)))
+        pending = deque()
+        try:
+            while windows or pending:
+                while windows and len(pending) < prefetch:
+                    offset, length = windows.popleft()
+                    pending.append((length, asyncio.ensure_future(self.get_rows(dataset, split, config, offset, length))))
+                length, page = pending.popleft()
+                rows = (await page)["rows"]
+                for row in rows:
+                    if row["row_idx"] in wanted:
+                        yield row
+                if len(rows) < length and total is None:
+                    # The split is shorter than requested
+                    break
+        finally:
+            for _, page in pending:
+                page.cancel()
+
+    async def _download_parquet(self, dataset: str, url: str) -> str:
+        # url: .../datasets/{dataset}/resolve/refs%2Fconvert%2Fparquet/{config}/{split}/0000.parquet
+        filename = unquote(url).split(f"/resolve/{PARQUET_REVISION}/", 1)[1]
+        return await asyncio.to_thread(self.retry.call_sync, lambda: hf_hub_download(
+            repo_id=dataset,
+            repo_type="dataset",
+            revision=PARQUET_REVISION,
+            filename=filename,
+            endpoint=self.sync_client.endpoint,
+            token=self.sync_client.api.token
+        ))
+
+    async def _get_tail(self, url: str, length: int) -> bytes:
+        session = self._ensure_session()
+        semaphore, limiter = self._host_limit(url)
+
+        async def attempt():
+            async with semaphore:
+                await limiter.acquire()
+                with get_metrics().span("hf.parquet_footer"):
+                    resp = await session.get(url, headers={**build_hf_headers(token=self.sync_client.api.token), "Range": f"bytes=-{length}"}, follow_redirects=True)
+            resp.raise_for_status()
+            # A server ignoring Range sends the whole file; its tail is what we asked for
+            return resp.content[-length:]
+
+        return await self.retry.call(attempt)
+
+    async def _parquet_num_rows(self, url: str) -> int:
+        """
+        Row count of a remote Parquet file, read from its footer with HTTP range requests.
+        """
+        tail = await self._get_tail(url, PARQUET_FOOTER_PROBE)
+        if tail[-4:] != b"PAR1":
+            raise ValueError(f"{url} is not a Parquet file")
+        footer_length = int.from_bytes(tail[-8:-4], "little")
+        if footer_length + 8 > len(tail):
+            tail = await self._get_tail(url, footer_length + 8)
+        # The footer alone, behind the leading magic, parses as a file without row groups' data
+        buffer = pa.BufferReader(b"PAR1" + tail[-(footer_length + 8):])
+        return await asyncio.to_thread(lambda: pq.ParquetFile(buffer).metadata.num_rows)
+
+    async def _iter_parquet_rows(self, dataset, config, split, max_rows, mode, seed, strata, prefetch):
+        if pq is None:
+            raise ImportError("pyarrow is required for source='parquet'")
+        files = await self.get_parquet_files(dataset, config, split)
+        semaphore = asyncio.Semaphore(prefetch)
+
+        async def num_rows(url):
+            async with semaphore:
+                return await self._parquet_num_rows(url)
+
+        async def download(url):
+            async with semaphore:
+                return await self._download_parquet(dataset, url)
+
+        # 先从各文件的 footer 得到行数，再只下载包含被选中行的文件
+        sizes = await asyncio.gather(*[num_rows(f["url"]) for f in files])
+        wanted = sorted(sample_row_indices(sum(sizes), max_rows, mode, seed, strata))
+        plan, start = [], 0
+        for f, size in zip(files, sizes):
+            file_indices = [idx for idx in wanted if start <= idx < start + size]
+            if file_indices:
+                plan.append((f["url"], start, set(file_indices)))
+            start += size
+        # 所需文件在后台按顺序下载，读取当前文件时下一个文件已在下载
+        downloads = [asyncio.ensure_future(download(url)) for url, _, _ in plan]
+        try:
+            for download_task, (_, base, file_wanted) in zip(downloads, plan):
+                path = await download_task
+                parquet_file = await asyncio.to_thread(pq.ParquetFile, path)
+                for group in range(parquet_file.num_row_groups):
+                    group_rows = parquet_file.metadata.row_group(group).num_rows
+                    if not any(base <= idx < base + group_rows for idx in file_wanted):
+                        base += group_rows
+                        continue
+                    rows = (await asyncio.to_thread(parquet_file.read_row_group, group)).to_pylist()
+                    for offset, row in enumerate(rows):
+                        if base + offset in file_wanted:
+                            yield {"row_idx": base + offset, "row": row, "truncated_cells": []}
+                    base += group_rows
+        finally:
+            for download_task in downloads:
+                download_task.cancel()
+
+    # -------------------------------
+    # Concurrent Fetching
+    # -------------------------------
+    async def fetch_dataset(self, dataset: str, max_rows: Optional[int] = None, row_sampling: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Fetch info, splits and the first rows of the first split for one dataset.
+        Info and splits are requested concurrently; first-rows waits for the split name.
+        With `row_sampling` (keyword arguments of iter_rows), rows are read through iter_rows instead,
+        so more than the first 100 rows or a random/stratified sample can be taken.
+        """
+        info, splits = await asyncio.gather(self.get_info(dataset), self.get_splits(dataset))
+        splits = splits["splits"]
+        first_split = splits[0]
+        if row_sampling is not None:
+            options = {"config": first_split.get("config", "default"), "split": first_split["split"], **row_sampling}
+            rows = [row async for row in self.iter_rows(dataset, max_rows=max_rows or 100, **options)]
+            return {"id": dataset, "info": info, "splits": splits, "rows": rows}
+        rows = (await self.get_first_rows(
+            dataset,
+            split=first_split["split"],
+            config=first_split.get("config", "default")
+        ))["rows"]
+        if max_rows is not None:
+            rows = rows[:max_rows]
+        return {"id": dataset, "info": info, "splits": splits, "rows": rows}
+
+    async def fetch_datasets(self, datasets: List[str], max_rows: Optional[int] = None, row_sampling: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch several datasets concurrently. Datasets that fail to load are logged and skipped.
+        """
+        results = await asyncio.gather(
+            *[self.fetch_dataset(dataset, max_rows=max_rows, row_sampling=row_sampling) for dataset in datasets],
+            return_exceptions=True
+        )
+        fetched = []
+        for dataset, result in zip(datasets, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Failed to fetch dataset {dataset}: {result!r}")
+                continue
+            fetched.append(result)
+        return fetched
+
+    async def aclose(self):
+        if self._session is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._session.aclose()
+            else:
+                self._close_stale_session(self._session, self._loop)
+            self._session = None
+        if self._closing:
+            await asyncio.gather(*self._closing)
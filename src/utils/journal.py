@@ -0,0 +1,62 @@
+import os
+import json
+import logging
+from typing import Any, Dict
+
+
+class RunJournal:
+    """
+    Append-only JSONL checkpoint of per-row stage results.
+    Each line records one (row key, stage, value); a None value records a rejection so resumed
+    runs skip the row instead of paying for it again.
+    """
+
+    def __init__(self, path: str = os.path.join("hf_logs", "hf_journal.jsonl"), resume: bool = False):
+        self.path = path
+        self.resume = resume
+        self.reused = 0
+        self.recorded = 0
+        self._results: Dict[str, Dict[str, Any]] = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+        self._file = open(path, mode="a" if resume else "w", encoding="utf-8")
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave a truncated last line behind
+                    continue
+                self._results.setdefault(entry["key"], {})[entry["stage"]] = entry["value"]
+        logging.info(f"Resuming from journal {self.path} with {len(self._results)} rows")
+
+    @staticmethod
+    def row_key(dataset_id: str, row_idx: Any) -> str:
+        return f"{dataset_id}#{row_idx}"
+
+    def has(self, key: str, stage: str) -> bool:
+        return stage in self._results.get(key, {})
+
+    def get(self, key: str, stage: str) -> Any:
+        self.reused += 1
+        return self._results[key][stage]
+
+    def record(self, key: str, stage: str, value: Any):
+        self._results.setdefault(key, {})[stage] = value
+        self._file.write(json.dumps({"key": key, "stage": stage, "value": value}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.recorded += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
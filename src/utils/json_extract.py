@@ -0,0 +1,93 @@
+import json
+from typing import Any, List, Optional
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class JsonScanner:
+    """
+    Incrementally scans streamed text for the first balanced JSON object ("{") or array ("[") that parses.
+    Brackets inside string literals are ignored. A balanced candidate that is not valid JSON (prose such
+    as "see [below]") is skipped and scanning resumes after its opening bracket.
+    """
+
+    def __init__(self, opener: str = "{"):
+        self.opener = opener
+        self.result: Optional[str] = None
+        self._reset()
+
+    def _reset(self):
+        self._parts = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+
+    def feed(self, text: str) -> Optional[str]:
+        """
+        Consume more text; returns the JSON text once the first valid value has closed.
+        """
+        while text and self.result is None:
+            text = self._scan(text)
+        return self.result
+
+    def _scan(self, text: str) -> str:
+        # Returns the text still to scan after a rejected candidate, or "" once `text` is consumed
+        for i, char in enumerate(text):
+            if not self._started:
+                if char != self.opener:
+                    continue
+                self._started = True
+            self._parts.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in _CLOSERS:
+                self._depth += 1
+            elif char in _CLOSERS.values():
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = "".join(self._parts)
+                    try:
+                        json.loads(candidate)
+                    except json.JSONDecodeError:
+                        self._reset()
+                        return candidate[1:] + text[i + 1:]
+                    self.result = candidate
+                    return ""
+        return ""
+
+
+def extract_json(text: str, opener: str = "{") -> Optional[Any]:
+    """
+    Parse the first balanced, valid JSON value starting with `opener` in `text`.
+    Returns None if nothing parses.
+    """
+    candidate = JsonScanner(opener).feed(text)
+    return json.loads(candidate) if candidate is not None else None
+
+
+def extract_json_items(text: str) -> List[Any]:
+    """
+    Items of the first JSON array in `text`. If the array is truncated (e.g. the reply hit its token cap),
+    the objects that did close are still returned.
+    """
+    items = extract_json(text, "[")
+    if isinstance(items, list):
+        return items
+    items = []
+    start = text.find("{", max(text.find("["), 0))
+    while start != -1:
+        candidate = JsonScanner("{").feed(text[start:])
+        if candidate is None:
+            break
+        items.append(json.loads(candidate))
+        # The scanner may have skipped invalid candidates before this one
+        start = text.find("{", text.index(candidate, start) + len(candidate))
+    return items
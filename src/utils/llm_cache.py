@@ -0,0 +1,131 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Dict
+
+
+class ResponseCache:
+    """
+    Persistent content-addressed cache for LLM completions backed by SQLite.
+    Entries are keyed by a hash of (model, temperature, prompt) and evicted by TTL and entry count.
+    """
+
+    def __init__(
+        self,
+        path: str = os.path.join("hf_logs", "llm_cache.sqlite"),
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        read_only: bool = False,
+        deterministic_only: bool = True,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.deterministic_only = deterministic_only
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                accessed_at REAL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str, variant: str = "") -> str:
+        # `variant` distinguishes request options (token caps, structured mode) that change the response
+        fields = [model, float(temperature), prompt] + ([variant] if variant else [])
+        payload = json.dumps(fields, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cacheable(self, temperature: float) -> bool:
+        return not self.deterministic_only or temperature == 0
+
+    def get(self, model: str, temperature: float, prompt: str, variant: str = "") -> Optional[str]:
+        if not self.cacheable(temperature):
+            return None
+        key = self.make_key(model, temperature, prompt, variant)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            if not self.read_only:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, model: str, temperature: float, prompt: str, response: str, variant: str = ""):
+        if self.read_only or response is None or not self.cacheable(temperature):
+            return
+        key = self.make_key(model, temperature, prompt, variant)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            self.writes += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        if self.max_entries is not None:
+            # Drop least-recently-used entries beyond the size limit
+            self._conn.execute(
+                """
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+
+    def purge(self):
+        """
+        Apply TTL and size eviction immediately.
+        """
+        if self.read_only:
+            return
+        with self._lock:
+            self._evict(time.time())
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,18 +1,254 @@
 import os
+import time
+import asyncio
+from typing import Optional
+
+import httpx
+import openai
 from openai import AsyncOpenAI
 
-async def chat_complete(prompt, model="deepseek-chat", temperature=0):
-    api_key = os.getenv("OPENAI_API_KEY")
-    base_url = os.getenv("OPENAI_BASE_URL")
-    
-    client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-    
-    response = await client.chat.completions.create(
-        model=model,
-        temperature=temperature,
-        messages=[
-            {"role": "user", "content": prompt},
-        ],
-        stream=False
-    )
-    return response.choices[0].message.content
\ No newline at end of file
+from .llm_cache import ResponseCache
+from .rate_limit import RateLimiter
+from .adaptive import AdaptiveConcurrencyLimiter, parse_retry_after
+from .retry import Hedge, RetryPolicy
+from .json_extract import JsonScanner
+from .metrics import get_metrics
+from .prompt_budget import count_tokens
+
+
+class LLMClient:
+    """
+    Long-lived async LLM client that reuses one keep-alive connection pool.
+    In-flight requests are capped by a concurrency limiter and paced by an optional RPM/TPM limiter.
+    With `adaptive_concurrency`, the cap moves between `min_concurrency` and `max_concurrency` (AIMD)
+    following 429/5xx responses and latency; Retry-After hints pause all new requests.
+    Transient failures are retried under `retry`; with `hedge`, a call slower than the p95 request
+    latency gets a duplicate and the first reply wins.
+    Deterministic completions are served from `cache` when one is configured.
+    With `structured_output`, calls that expect JSON request it from the endpoint (when `json_mode`
+    is supported), stream the completion and stop as soon as the first balanced JSON value is complete.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 16,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        timeout: float = 120.0,
+        cache: Optional[ResponseCache] = None,
+        structured_output: bool = False,
+        json_mode: bool = True,
+        adaptive_concurrency: bool = False,
+        min_concurrency: int = 1,
+        retry: Optional[RetryPolicy] = None,
+        hedge: bool = False,
+    ):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.limiter = RateLimiter(rpm=rpm, tpm=tpm)
+        self.cache = cache
+        self.structured_output = structured_output
+        self.json_mode = json_mode
+        self.retry = retry or RetryPolicy(max_attempts=3, name="llm")
+        self.hedge = Hedge("llm.request", name="llm") if hedge else None
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=max(min_concurrency, max_concurrency // 4),
+            min_limit=min_concurrency,
+            max_limit=max_concurrency,
+            adaptive=adaptive_concurrency,
+        )
+        self.early_stops = 0
+        self._client = None
+        self._loop = None
+
+    def _ensure_client(self) -> AsyncOpenAI:
+        # Connection pools are bound to the event loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            # Retries happen in chat_complete so the concurrency limiter sees every 429/5xx
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0)
+            self._loop = loop
+        return self._client
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """
+        Local token count used for TPM pacing before the real usage is known.
+        """
+        return count_tokens(text)
+
+    async def chat_complete(
+        self,
+        prompt: str,
+        model: str = "deepseek-chat",
+        temperature: float = 0,
+        max_tokens: Optional[int] = None,
+        structured: Optional[str] = None,
+    ) -> str:
+        """
+        `structured` is "object" or "array" when the caller expects that JSON value in the reply.
+        It only changes the request when `structured_output` is enabled on this client.
+        """
+        metrics = get_metrics()
+        structured = structured if self.structured_output else None
+        variant = f"{structured or ''}:{max_tokens or ''}" if (structured or max_tokens) else ""
+        if self.cache is not None:
+            if self.cache.cacheable(temperature):
+                cached = self.cache.get(model, temperature, prompt, variant)
+                if cached is not None:
+                    metrics.incr("llm.cache_hits")
+                    return cached
+                metrics.incr("llm.cache_misses")
+            else:
+                # Sampled requests (temperature > 0 with deterministic_only) never touch the cache
+                metrics.incr("llm.cache_bypass")
+
+        client = self._ensure_client()
+        options = {}
+        if max_tokens is not None:
+            options["max_tokens"] = max_tokens
+        if structured == "object" and self.json_mode:
+            options["response_format"] = {"type": "json_object"}
+
+        def attempt(started=None):
+            return self._attempt(client, prompt, model, temperature, structured, max_tokens, options, started)
+
+        with metrics.span("llm.chat_complete", model=model, structured=structured):
+            if self.hedge is None:
+                result = await self.retry.call(attempt)
+            else:
+                result = await self.retry.call(lambda: self.hedge.call(attempt))
+        content, prompt_tokens, completion_tokens = result
+        metrics.incr("llm.requests")
+        metrics.incr("llm.prompt_tokens", prompt_tokens)
+        metrics.incr("llm.completion_tokens", completion_tokens)
+
+        if self.cache is not None:
+            self.cache.set(model, temperature, prompt, content, variant)
+        return content
+
+    async def _attempt(self, client, prompt, model, temperature, structured, max_tokens, options, started=None):
+        metrics = get_metrics()
+        async with self.concurrency.slot():
+            entry = await self.limiter.acquire(self.estimate_tokens(prompt))
+            if started is not None:
+                started.set()
+            start = time.monotonic()
+            try:
+                with metrics.span("llm.request"):
+                    if structured is None:
+                        response = await client.chat.completions.create(
+                            model=model,
+                            temperature=temperature,
+                            messages=[
+                                {"role": "user", "content": prompt},
+                            ],
+                            stream=False,
+                            **options
+                        )
+                        content = response.choices[0].message.content
+                        if response.usage is not None:
+                            entry[1] = response.usage.total_tokens
+                            prompt_tokens = response.usage.prompt_tokens
+                            completion_tokens = response.usage.completion_tokens
+                        else:
+                            prompt_tokens = self.estimate_tokens(prompt)
+                            completion_tokens = self.estimate_tokens(content or "")
+                    else:
+                        content = await self._stream_json(client, prompt, model, temperature, structured, options)
+                        prompt_tokens = self.estimate_tokens(prompt)
+                        completion_tokens = self.estimate_tokens(content)
+                        entry[1] = prompt_tokens + completion_tokens
+            except (openai.RateLimitError, openai.InternalServerError, openai.APITimeoutError) as e:
+                retry_after = parse_retry_after(e.response.headers) if isinstance(e, openai.APIStatusError) else None
+                self.concurrency.on_overload(retry_after)
+                raise
+            # Calls with different token caps have different normal latencies
+            self.concurrency.on_success(time.monotonic() - start, kind=(structured, max_tokens))
+        return content, prompt_tokens, completion_tokens
+
+    async def _stream_json(self, client, prompt, model, temperature, structured, options) -> str:
+        scanner = JsonScanner("{" if structured == "object" else "[")
+        parts = []
+        stream = await client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=[
+                {"role": "user", "content": prompt},
+            ],
+            stream=True,
+            **options
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                parts.append(delta)
+                if scanner.feed(delta) is not None:
+                    # Drop the rest of the completion instead of paying for it
+                    if chunk.choices[0].finish_reason is None:
+                        self.early_stops += 1
+                        get_metrics().incr("llm.early_stops")
+                    return scanner.result
+        finally:
+            await stream.close()
+        return "".join(parts)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        if self.cache is not None:
+            self.cache.close()
+
+
+_default_client: Optional[LLMClient] = None
+
+
+def get_llm_client() -> LLMClient:
+    """
+    Return the process-wide LLM client, creating it from the environment on first use.
+    """
+    global _default_client
+    if _default_client is None:
+        cache_path = os.getenv("LLM_CACHE_PATH")
+        _default_client = LLMClient(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            adaptive_concurrency=os.getenv("LLM_ADAPTIVE_CONCURRENCY", "").lower() in ("1", "true", "yes"),
+            rpm=int(os.getenv("LLM_RPM")) if os.getenv("LLM_RPM") else None,
+            tpm=int(os.getenv("LLM_TPM")) if os.getenv("LLM_TPM") else None,
+            cache=ResponseCache(cache_path) if cache_path else None,
+        )
+    return _default_client
+
+
+def set_llm_client(client: LLMClient):
+    """
+    Replace the process-wide LLM client used by `chat_complete`.
+    """
+    global _default_client
+    _default_client = client
+
+
+async def chat_complete(
+    prompt,
+    model="deepseek-chat",
+    temperature=0,
+    client: Optional[LLMClient] = None,
+    max_tokens: Optional[int] = None,
+    structured: Optional[str] = None,
+):
+    client = client or get_llm_client()
+    return await client.chat_complete(prompt, model=model, temperature=temperature, max_tokens=max_tokens, structured=structured)
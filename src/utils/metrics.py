@@ -0,0 +1,156 @@
+import os
+import json
+import math
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+
+class Histogram:
+    """
+    Log-bucketed latency histogram with constant memory; percentiles are bucket upper bounds.
+    """
+
+    def __init__(self, base: float = 0.001, factor: float = 1.2, buckets: int = 80):
+        self.base = base
+        self.factor = factor
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = 0 if value <= self.base else int(math.log(value / self.base, self.factor)) + 1
+        self.counts[min(index, len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.base * self.factor ** index, self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Process-wide registry of counters, in-flight gauges and latency histograms.
+    Spans can also be recorded as Chrome trace events (chrome://tracing, Perfetto) for the async timeline.
+    """
+
+    def __init__(self, trace: bool = False, max_trace_events: int = 200000):
+        self.trace = trace
+        self.max_trace_events = max_trace_events
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.max_in_flight: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self._events: List[dict] = []
+        self._lanes: Dict[int, int] = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def _lane(self) -> int:
+        # Each asyncio task (or thread) gets its own row in the trace viewer
+        try:
+            owner = id(asyncio.current_task())
+        except RuntimeError:
+            owner = threading.get_ident()
+        if owner not in self._lanes:
+            self._lanes[owner] = len(self._lanes) + 1
+        return self._lanes[owner]
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Time a block (sync or containing awaits), tracking in-flight count and latency under `name`.
+        """
+        with self._lock:
+            self.in_flight[name] = self.in_flight.get(name, 0) + 1
+            self.max_in_flight[name] = max(self.max_in_flight.get(name, 0), self.in_flight[name])
+        lane = self._lane() if self.trace else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.in_flight[name] -= 1
+            self.observe(name, duration)
+            if self.trace and len(self._events) < self.max_trace_events:
+                self._events.append({
+                    "name": name,
+                    "cat": name.split(".")[0],
+                    "ph": "X",
+                    "ts": (start - self._start) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": lane,
+                    "args": attrs,
+                })
+
+    def summary_table(self) -> str:
+        lines = [f"{'span':<32}{'count':>8}{'p50(s)':>10}{'p95(s)':>10}{'p99(s)':>10}{'max(s)':>10}{'peak':>7}"]
+        for name in sorted(self.histograms):
+            h = self.histograms[name]
+            lines.append(
+                f"{name:<32}{h.count:>8}{h.percentile(0.5):>10.3f}{h.percentile(0.95):>10.3f}"
+                f"{h.percentile(0.99):>10.3f}{h.max:>10.3f}{self.max_in_flight.get(name, 0):>7}"
+            )
+        if self.counters:
+            lines.append("")
+            lines.append(f"{'counter':<48}{'value':>12}")
+            for name in sorted(self.counters):
+                lines.append(f"{name:<48}{self.counters[name]:>12g}")
+        if self.gauges:
+            lines.append("")
+            lines.append(f"{'gauge':<48}{'value':>12}")
+            for name in sorted(self.gauges):
+                lines.append(f"{name:<48}{self.gauges[name]:>12g}")
+        return "\n".join(lines)
+
+    def export_trace(self, path: str):
+        """
+        Write recorded spans in Chrome trace JSON format.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, f)
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def set_metrics(metrics: Metrics):
+    global _metrics
+    _metrics = metrics
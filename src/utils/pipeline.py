@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import get_metrics
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a StreamingPipeline.
+    `fn` maps an item to a new item, or to None to drop it. It runs on `workers` concurrent workers.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Any], Awaitable[Optional[Any]]], workers: int = 1, queue_size: Optional[int] = None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.queue_size = queue_size
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"processed": self.processed, "dropped": self.dropped, "failed": self.failed}
+
+
+class StreamingPipeline:
+    """
+    Runs a source through a chain of stages connected by bounded async queues.
+    A full queue blocks the stage in front of it, so memory stays bounded by the queue
+    sizes and worker counts rather than by the number of items.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 64):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    async def _run_stage(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue, downstream_workers: int):
+        metrics = get_metrics()
+
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                try:
+                    with metrics.span(f"stage.{stage.name}"):
+                        result = await stage.fn(item)
+                except Exception:
+                    # One bad item must not take the whole stream down
+                    stage.failed += 1
+                    metrics.incr(f"stage.{stage.name}.failed")
+                    logging.exception(f"Stage {stage.name} failed on an item")
+                    continue
+                stage.processed += 1
+                if result is None:
+                    stage.dropped += 1
+                    metrics.incr(f"stage.{stage.name}.rejected")
+                    continue
+                metrics.incr(f"stage.{stage.name}.accepted")
+                await outbox.put(result)
+
+        await asyncio.gather(*[worker() for _ in range(stage.workers)])
+        for _ in range(downstream_workers):
+            await outbox.put(_DONE)
+
+    async def run(self, source: AsyncIterable[Any], sink: Callable[[Any], Awaitable[None]], sink_workers: int = 1) -> Dict[str, Dict[str, int]]:
+        """
+        Feed every item of `source` through the stages into `sink`.
+        Returns per-stage counters.
+        """
+        queues = [asyncio.Queue(maxsize=stage.queue_size or self.queue_size) for stage in self.stages]
+        queues.append(asyncio.Queue(maxsize=self.queue_size))
+        sink_stage = Stage("sink", sink, workers=sink_workers)
+
+        async def produce():
+            async for item in source:
+                await queues[0].put(item)
+            for _ in range(self.stages[0].workers if self.stages else sink_workers):
+                await queues[0].put(_DONE)
+
+        async def consume():
+            async def worker():
+                while True:
+                    item = await queues[-1].get()
+                    if item is _DONE:
+                        return
+                    try:
+                        await sink(item)
+                        sink_stage.processed += 1
+                    except Exception:
+                        sink_stage.failed += 1
+                        logging.exception("Sink failed on an item")
+
+            await asyncio.gather(*[worker() for _ in range(sink_workers)])
+
+        coros = [produce()]
+        for i, stage in enumerate(self.stages):
+            next_workers = self.stages[i + 1].workers if i + 1 < len(self.stages) else sink_workers
+            coros.append(self._run_stage(stage, queues[i], queues[i + 1], next_workers))
+        coros.append(consume())
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failing source would otherwise leave the workers blocked on their queues
+            for task in tasks:
+                task.cancel()
+            raise
+
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats["sink"] = sink_stage.stats()
+        return stats
@@ -0,0 +1,124 @@
+import re
+import logging
+from typing import Any, Dict, Optional
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+DEFAULT_ENCODING = "cl100k_base"
+TRUNCATION_MARKER = " …[{count} tokens truncated]… "
+
+_BASE64 = re.compile(r"^(data:[\w/+.-]+;base64,)?[A-Za-z0-9+/=\n]+$")
+_tokenizer = None
+_tokenizer_loaded = False
+
+
+def get_tokenizer():
+    """
+    The local tiktoken encoding, loaded once; None when tiktoken or its encoding file is unavailable.
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        if tiktoken is not None:
+            try:
+                _tokenizer = tiktoken.get_encoding(DEFAULT_ENCODING)
+            except Exception as e:
+                # The encoding is downloaded on first use, which fails offline
+                logging.warning(f"tiktoken encoding {DEFAULT_ENCODING} unavailable, estimating tokens from characters: {e!r}")
+    return _tokenizer
+
+
+def count_tokens(text: Any) -> int:
+    """
+    Token count of `text` (str() of anything else) with the local tokenizer.
+    Without one, ASCII counts about 4 characters per token and other characters (CJK, ...) one token each.
+    """
+    if not isinstance(text, str):
+        text = str(text)
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return max(1, (len(text) - non_ascii) // 4 + non_ascii)
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """
+    Cut `text` to about `max_tokens`, keeping the head and the tail around a marker with the number of dropped tokens.
+    """
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+    keep = max(max_tokens - 16, 2)
+    head, tail = keep * 2 // 3, keep - keep * 2 // 3
+    marker = TRUNCATION_MARKER.format(count=total - keep)
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        tokens = tokenizer.encode(text, disallowed_special=())
+        return tokenizer.decode(tokens[:head]) + marker + tokenizer.decode(tokens[-tail:])
+    # Same proportions in characters
+    chars_per_token = len(text) / total
+    return text[:int(head * chars_per_token)] + marker + text[-int(tail * chars_per_token):]
+
+
+def preview_value(value: Any, max_chars: int = 80, max_items: int = 3) -> Any:
+    """
+    Small stand-in for a row value: strings are cut to `max_chars`, base64 payloads and bytes are
+    replaced by their size, and lists/dicts keep their first `max_items` entries (dict keys up to 10).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str):
+        if len(value) <= max_chars:
+            return value
+        if len(value) > 256 and _BASE64.match(value[:4096]):
+            return f"<base64 data, {len(value)} chars>"
+        return f"{value[:max_chars]}… ({len(value)} chars)"
+    if isinstance(value, dict):
+        preview = {key: preview_value(item, max_chars, max_items) for key, item in list(value.items())[:10]}
+        if len(value) > 10:
+            preview["…"] = f"{len(value)} keys"
+        return preview
+    if isinstance(value, (list, tuple)):
+        preview = [preview_value(item, max_chars, max_items) for item in value[:max_items]]
+        if len(value) > max_items:
+            preview.append(f"… ({len(value)} items)")
+        return preview
+    return value
+
+
+def row_preview(row: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """
+    Keys of `row` with value previews, shrunk until the preview fits in `max_tokens`.
+    """
+    for max_chars in (200, 80, 30):
+        preview = {key: preview_value(value, max_chars) for key, value in row.items()}
+        if count_tokens(str(preview)) <= max_tokens:
+            return preview
+    return {key: type(value).__name__ for key, value in row.items()}
+
+
+def fit_sample(sample: Dict[str, Any], max_tokens: int, min_field_tokens: int = 64) -> Optional[Dict[str, Any]]:
+    """
+    Truncate the longest fields of an {"input", "output"} sample until it fits in `max_tokens`.
+    Returns the sample unchanged when it already fits, and None when even `min_field_tokens`
+    per field would not fit.
+    """
+    sizes = {key: count_tokens(value) for key, value in sample.items()}
+    if sum(sizes.values()) <= max_tokens:
+        return sample
+    if min_field_tokens * len(sizes) > max_tokens:
+        return None
+    # Give short fields their full size and share the rest evenly among the long ones
+    budget, limits = max_tokens, {}
+    for key in sorted(sizes, key=sizes.get):
+        share = budget // (len(sizes) - len(limits))
+        limits[key] = min(sizes[key], share)
+        budget -= limits[key]
+    return {
+        key: truncate_text(value if isinstance(value, str) else str(value), limits[key]) if sizes[key] > limits[key] else value
+        for key, value in sample.items()
+    }
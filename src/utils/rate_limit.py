@@ -0,0 +1,57 @@
+import time
+import asyncio
+from collections import deque
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter for requests-per-minute and tokens-per-minute budgets.
+    Either budget may be None to disable it.
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None, window: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._events = deque()  # [timestamp, tokens]
+        self._lock = None
+        self._loop = None
+
+    def _prune(self, now: float):
+        while self._events and now - self._events[0][0] >= self.window:
+            self._events.popleft()
+
+    def _wait_time(self, now: float, tokens: int) -> float:
+        if self.rpm and len(self._events) >= self.rpm:
+            return self._events[0][0] + self.window - now
+        if self.tpm:
+            used = sum(e[1] for e in self._events)
+            if self._events and used + tokens > self.tpm:
+                # Wait until enough of the window has expired to fit this request
+                for ts, spent in self._events:
+                    used -= spent
+                    if used + tokens <= self.tpm:
+                        return ts + self.window - now
+                return self._events[-1][0] + self.window - now
+        return 0.0
+
+    async def acquire(self, tokens: int = 0) -> list:
+        """
+        Wait until a request of `tokens` estimated tokens fits both budgets.
+        Returns the window entry so callers can correct the token count afterwards.
+        """
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._prune(now)
+                delay = self._wait_time(now, tokens)
+                if delay <= 0:
+                    entry = [now, tokens]
+                    self._events.append(entry)
+                    return entry
+                await asyncio.sleep(delay)
@@ -0,0 +1,151 @@
+import os
+import gzip
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+SCORE_COLUMNS = ["Relevance", "Correctness", "Helpfulness", "Clarity", "Difficulty"]
+
+
+def result_schema():
+    return pa.schema(
+        [pa.field(name, pa.string()) for name in ["task_definition", "keyword", "dataset_id"]]
+        + [pa.field("row_idx", pa.int64())]
+        + [pa.field(name, pa.string()) for name in ["original_input", "original_output", "formatted_input", "formatted_output"]]
+        + [pa.field(f"score_{name.lower()}", pa.int64()) for name in SCORE_COLUMNS]
+    )
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def make_result_record(task_description, keyword, dataset_id, row_idx, original_sample, scores, formatted_sample) -> Dict[str, Any]:
+    """
+    Flatten one processed sample into a typed record: one column per judge score instead of str(dict).
+    """
+    record = {
+        "task_definition": task_description,
+        "keyword": keyword,
+        "dataset_id": dataset_id,
+        "row_idx": _as_int(row_idx),
+        "original_input": _as_text(original_sample["input"]),
+        "original_output": _as_text(original_sample["output"]),
+        "formatted_input": _as_text(formatted_sample["input"]),
+        "formatted_output": _as_text(formatted_sample["output"]),
+    }
+    for name in SCORE_COLUMNS:
+        record[f"score_{name.lower()}"] = _as_int(scores.get(name))
+    return record
+
+
+class ShardedResultWriter:
+    """
+    Streams result records into numbered shards under `output_dir`.
+    JSONL lines are written as they arrive; Parquet rows are buffered per row group.
+    A new shard starts every `shard_size` records. `compression` is the Parquet codec;
+    "gzip" also compresses the JSONL shards.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = os.path.join("hf_logs", "results"),
+        formats: Iterable[str] = ("jsonl",),
+        shard_size: int = 10000,
+        row_group_size: int = 1000,
+        compression: Optional[str] = None,
+    ):
+        self.output_dir = output_dir
+        self.formats = list(formats)
+        self.shard_size = shard_size
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.records_written = 0
+        self.shards: List[str] = []
+        self._shard_index = -1
+        self._shard_count = 0
+        self._jsonl_file = None
+        self._parquet_writer = None
+        self._buffer: List[Dict[str, Any]] = []
+
+        unknown = set(self.formats) - {"jsonl", "parquet"}
+        if unknown:
+            raise ValueError(f"Unsupported result formats: {sorted(unknown)}")
+        if "parquet" in self.formats and pa is None:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+        os.makedirs(output_dir, exist_ok=True)
+        # Shards left by an earlier, longer run would otherwise be mixed into this one
+        for name in os.listdir(output_dir):
+            if name.startswith("part-"):
+                os.remove(os.path.join(output_dir, name))
+
+    def _shard_path(self, extension: str) -> str:
+        return os.path.join(self.output_dir, f"part-{self._shard_index:05d}.{extension}")
+
+    def _open_shard(self):
+        self._close_shard()
+        self._shard_index += 1
+        self._shard_count = 0
+        if "jsonl" in self.formats:
+            if self.compression == "gzip":
+                path = self._shard_path("jsonl.gz")
+                self._jsonl_file = gzip.open(path, mode="wt", encoding="utf-8")
+            else:
+                path = self._shard_path("jsonl")
+                self._jsonl_file = open(path, mode="w", encoding="utf-8")
+            self.shards.append(path)
+        if "parquet" in self.formats:
+            path = self._shard_path("parquet")
+            self._parquet_writer = pq.ParquetWriter(path, result_schema(), compression=self.compression or "snappy")
+            self.shards.append(path)
+
+    def _flush_row_group(self):
+        if self._parquet_writer is not None and self._buffer:
+            self._parquet_writer.write_table(pa.Table.from_pylist(self._buffer, schema=result_schema()))
+        self._buffer = []
+
+    def _close_shard(self):
+        self._flush_row_group()
+        if self._jsonl_file is not None:
+            self._jsonl_file.close()
+            self._jsonl_file = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+    def write(self, record: Dict[str, Any]):
+        if self._shard_index < 0 or self._shard_count >= self.shard_size:
+            self._open_shard()
+        if self._jsonl_file is not None:
+            self._jsonl_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._jsonl_file.flush()
+        if self._parquet_writer is not None:
+            self._buffer.append(record)
+            if len(self._buffer) >= self.row_group_size:
+                self._flush_row_group()
+        self._shard_count += 1
+        self.records_written += 1
+
+    def close(self):
+        self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,192 @@
+import time
+import random
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import openai
+import requests
+
+from .adaptive import parse_retry_after
+from .metrics import get_metrics
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    """
+    Retry-After hint carried by the HTTP response attached to `exc`, if any.
+    """
+    return parse_retry_after(getattr(getattr(exc, "response", None), "headers", None))
+
+
+def is_transient(exc: BaseException, idempotent: bool = True) -> bool:
+    """
+    Whether `exc` is worth retrying.
+    Non-idempotent calls are only retried when the request certainly was not processed
+    (connection refused, 429), since a timeout or 5xx may have happened after the side effect.
+    """
+    if isinstance(exc, (httpx.ConnectError, requests.exceptions.ConnectionError)) and not isinstance(exc, requests.exceptions.Timeout):
+        return True
+    if isinstance(exc, openai.APIConnectionError) and not isinstance(exc, openai.APITimeoutError):
+        return True
+    status = _status_of(exc)
+    if status == 429:
+        return True
+    if not idempotent:
+        return False
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, (TimeoutError, httpx.TransportError, requests.exceptions.Timeout, openai.APITimeoutError))
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by `max_attempts` and an overall `deadline` in seconds.
+    Retry-After hints are honored as a lower bound on the wait. `attempt_timeout` bounds each async attempt.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        deadline: Optional[float] = None,
+        attempt_timeout: Optional[float] = None,
+        idempotent: bool = True,
+        name: str = "call",
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        self.idempotent = idempotent
+        self.name = name
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def _next_delay(self, exc: Exception, attempt: int, started: float) -> Optional[float]:
+        # 返回下一次重试前的等待时间；None 表示放弃
+        if attempt >= self.max_attempts or not is_transient(exc, self.idempotent):
+            return None
+        delay = self.backoff(attempt - 1, retry_after_of(exc))
+        if self.deadline is not None and time.monotonic() - started + delay >= self.deadline:
+            return None
+        get_metrics().incr(f"{self.name}.retries")
+        return delay
+
+    def _timeout(self, started: float) -> Optional[float]:
+        limits = [self.attempt_timeout]
+        if self.deadline is not None:
+            limits.append(max(0.0, self.deadline - (time.monotonic() - started)))
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await `fn()` until it succeeds or the policy gives up, re-raising the last error.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await asyncio.wait_for(fn(), self._timeout(started))
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def call_sync(self, fn: Callable[[], T]) -> T:
+        """
+        Blocking counterpart of `call`; per-attempt timeouts are left to the underlying client.
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._next_delay(e, attempt, started)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+
+class Hedge:
+    """
+    Hedged requests: once a call has been in flight longer than the `quantile` latency recorded under
+    the metrics span `span`, a duplicate is fired and whichever finishes first wins; the other is cancelled.
+    `fn` receives an asyncio.Event to set when the request actually goes out, so time spent queued
+    behind concurrency limits doesn't trigger hedges.
+    Hedging starts after `min_samples` observations and is capped at `max_ratio` of all calls.
+    """
+
+    def __init__(self, span: str, quantile: float = 0.95, min_samples: int = 20, max_ratio: float = 0.1, name: Optional[str] = None):
+        self.span = span
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.name = name or span
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def delay(self) -> Optional[float]:
+        histogram = get_metrics().histograms.get(self.span)
+        if histogram is None or histogram.count < self.min_samples:
+            return None
+        return histogram.percentile(self.quantile)
+
+    async def call(self, fn: Callable[[asyncio.Event], Awaitable[T]]) -> T:
+        self.calls += 1
+        delay = self.delay()
+        if delay is None or self.hedges >= self.max_ratio * self.calls:
+            return await fn(asyncio.Event())
+
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(fn(started))
+        waiter = asyncio.ensure_future(started.wait())
+        pending = {primary, waiter}
+        try:
+            await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+            pending = {primary}
+            if not primary.done():
+                await asyncio.wait(pending, timeout=delay)
+            if primary.done():
+                return primary.result()
+            self.hedges += 1
+            get_metrics().incr(f"{self.name}.hedges")
+            pending.add(asyncio.ensure_future(fn(asyncio.Event())))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.wins += 1
+                            get_metrics().incr(f"{self.name}.hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self):
+        return {"calls": self.calls, "hedges": self.hedges, "wins": self.wins}
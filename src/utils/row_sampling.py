@@ -0,0 +1,56 @@
+import random
+from typing import List, Optional, Tuple
+
+SAMPLE_MODES = ("head", "random", "stratified")
+
+
+def sample_row_indices(total: Optional[int], count: int, mode: str = "head", seed: int = 0, strata: int = 10) -> List[int]:
+    """
+    Choose `count` row indices out of `total`, sorted.
+    - head: the first rows
+    - random: a seeded uniform sample
+    - stratified: the rows are cut into `strata` equal ranges and a seeded random contiguous run is taken
+      from each, which covers the whole dataset while keeping requests few
+    """
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f"Unknown sample mode {mode!r}, expected one of {SAMPLE_MODES}")
+    if total is None:
+        if mode != "head":
+            raise ValueError(f"Sample mode {mode!r} needs the row count")
+        return list(range(count))
+    count = min(count, total)
+    if mode == "head" or count == total:
+        return list(range(count))
+    rng = random.Random(seed)
+    if mode == "random":
+        return sorted(rng.sample(range(total), count))
+
+    strata = max(1, min(strata, count))
+    indices = []
+    for stratum in range(strata):
+        start = stratum * total // strata
+        end = (stratum + 1) * total // strata
+        # Spread the remainder over the first strata
+        run = count // strata + (1 if stratum < count % strata else 0)
+        offset = rng.randint(start, max(start, end - run))
+        indices.extend(range(offset, min(offset + run, end)))
+    return indices
+
+
+def plan_windows(indices: List[int], page_size: int = 100) -> List[Tuple[int, int]]:
+    """
+    Coalesce sorted row indices into (offset, length) windows of at most `page_size` rows,
+    so nearby rows share one request.
+    """
+    windows = []
+    start = last = None
+    for idx in indices:
+        if start is not None and idx - start < page_size:
+            last = idx
+            continue
+        if start is not None:
+            windows.append((start, last - start + 1))
+        start = last = idx
+    if start is not None:
+        windows.append((start, last - start + 1))
+    return windows
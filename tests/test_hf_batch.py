@@ -0,0 +1,100 @@
+import os
+import json
+import logging
+import asyncio
+import argparse
+
+from src.utils.hf_client import AsyncHFClient
+from src.utils.llm_client import LLMClient, get_llm_client, set_llm_client
+from src.utils.llm_cache import ResponseCache
+from src.utils.hf_cache import MetadataCache
+from src.utils.metrics import Metrics, get_metrics, set_metrics
+from src.utils.retry import RetryPolicy
+from src.huggingface.hf_batch import load_manifest, run_batch
+from src.huggingface.surrogate import JudgeLog, set_judge_log
+
+from configs.hf_config import LLM_API_KEY, LLM_BASE_URL, LLM_MAX_CONCURRENCY, LLM_ADAPTIVE_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_RPM, LLM_TPM, LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_READ_ONLY, LLM_STRUCTURED_OUTPUT, LLM_JSON_MODE, LLM_RETRY, LLM_HEDGE, HUGGINGFACE_TOKEN, HF_MAX_CONCURRENCY_PER_HOST, HF_RPM_PER_HOST, HF_CACHE_PATH, HF_CACHE_OFFLINE, HF_RETRY, HF_HEDGE, TASK_DATASETS_COUNT, TASK_DATA_SAMPLES, ROW_SAMPLING, DATASET_RANKING, PIPELINE_WORKERS, PIPELINE_QUEUE_SIZE, JUDGE_BATCH_SIZE, CONVERT_BATCH_SIZE, BATCH_TOKEN_BUDGET, RESULT_FORMATS, RESULT_SHARD_SIZE, RESULT_COMPRESSION, DEDUP_ENABLED, DEDUP_THRESHOLD, METRICS_TRACE, METRICS_TRACE_PATH, SPECULATION, JUDGE_LOG_PATH, SURROGATE_ENABLED, SURROGATE_SETTINGS, PREFILTER_ENABLED, PREFILTER_SETTINGS, BATCH_OUTPUT_DIR, BATCH_MAX_CONCURRENT_TASKS
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+
+os.environ["OPENAI_API_KEY"] = LLM_API_KEY
+os.environ["OPENAI_BASE_URL"] = LLM_BASE_URL
+
+set_metrics(Metrics(trace=METRICS_TRACE))
+set_judge_log(JudgeLog(JUDGE_LOG_PATH) if JUDGE_LOG_PATH else None)
+
+# 所有任务共享同一个 LLM 客户端：一个连接池、一组并发/速率限制和一个响应缓存
+set_llm_client(LLMClient(
+    api_key=LLM_API_KEY,
+    base_url=LLM_BASE_URL,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    adaptive_concurrency=LLM_ADAPTIVE_CONCURRENCY,
+    min_concurrency=LLM_MIN_CONCURRENCY,
+    rpm=LLM_RPM,
+    tpm=LLM_TPM,
+    cache=ResponseCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, read_only=LLM_CACHE_READ_ONLY),
+    structured_output=LLM_STRUCTURED_OUTPUT,
+    json_mode=LLM_JSON_MODE,
+    retry=RetryPolicy(**LLM_RETRY, name="llm"),
+    hedge=LLM_HEDGE
+))
+
+async def main(manifest, output_dir, max_concurrent_tasks, resume=False):
+    tasks = load_manifest(manifest)
+    # 所有任务共享同一个 HF 客户端（每主机并发/速率限制和元数据缓存）
+    hf_client = AsyncHFClient(
+        hf_token=HUGGINGFACE_TOKEN,
+        max_concurrency_per_host=HF_MAX_CONCURRENCY_PER_HOST,
+        rpm_per_host=HF_RPM_PER_HOST,
+        cache=MetadataCache(HF_CACHE_PATH, offline=HF_CACHE_OFFLINE),
+        retry=RetryPolicy(**HF_RETRY, name="hf"),
+        hedge=HF_HEDGE
+    )
+    summaries = await run_batch(
+        tasks, hf_client, output_dir,
+        max_concurrent_tasks=max_concurrent_tasks,
+        resume=resume,
+        result_formats=RESULT_FORMATS,
+        result_shard_size=RESULT_SHARD_SIZE,
+        result_compression=RESULT_COMPRESSION,
+        dedup_threshold=DEDUP_THRESHOLD if DEDUP_ENABLED else None,
+        prefilter_settings=PREFILTER_SETTINGS if PREFILTER_ENABLED else None,
+        surrogate_settings=SURROGATE_SETTINGS if SURROGATE_ENABLED else None,
+        speculation_settings=SPECULATION,
+        task_datasets_count=TASK_DATASETS_COUNT,
+        task_data_samples=TASK_DATA_SAMPLES,
+        row_sampling=ROW_SAMPLING,
+        ranking=DATASET_RANKING,
+        workers=PIPELINE_WORKERS,
+        queue_size=PIPELINE_QUEUE_SIZE,
+        judge_batch_size=JUDGE_BATCH_SIZE,
+        convert_batch_size=CONVERT_BATCH_SIZE,
+        batch_token_budget=BATCH_TOKEN_BUDGET
+    )
+    await hf_client.aclose()
+    failed = [summary["name"] for summary in summaries if summary["status"] != "ok"]
+    logging.info(f"✅ {len(summaries) - len(failed)}/{len(summaries)} tasks done, "
+                 f"{sum(summary.get('records_written', 0) for summary in summaries)} samples written under {output_dir}")
+    if failed:
+        logging.warning(f"Failed tasks: {json.dumps(failed, ensure_ascii=False)}")
+    logging.info(f"LLM cache stats: {get_llm_client().cache.stats()}")
+    logging.info(f"HF cache stats: {hf_client.cache.stats()}")
+    logging.info(f"LLM concurrency: {get_llm_client().concurrency.stats()}")
+    logging.info("Run metrics:\n" + get_metrics().summary_table())
+    if METRICS_TRACE:
+        get_metrics().export_trace(METRICS_TRACE_PATH)
+        logging.info(f"Trace written to {METRICS_TRACE_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl and process Hugging Face datasets for every task in a manifest, in one event loop.")
+    parser.add_argument("manifest", help="JSON list or JSONL of tasks (task_description, input_format, output_format[, name, ...]).")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR, help="Per-task results, journals and dedup indexes go to <output-dir>/<name>.")
+    parser.add_argument("--max-concurrent-tasks", type=int, default=BATCH_MAX_CONCURRENT_TASKS)
+    parser.add_argument("--resume", action="store_true", help="Reuse stage results recorded in each task's journal by a previous run.")
+    args = parser.parse_args()
+    asyncio.run(main(args.manifest, args.output_dir, args.max_concurrent_tasks, resume=args.resume))
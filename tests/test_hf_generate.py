@@ -0,0 +1,74 @@
+import os
+import logging
+import asyncio
+import argparse
+
+from src.utils.llm_client import LLMClient, get_llm_client, set_llm_client
+from src.utils.llm_cache import ResponseCache
+from src.utils.result_store import ShardedResultWriter
+from src.utils.dedup import NearDuplicateIndex
+from src.utils.metrics import Metrics, get_metrics, set_metrics
+from src.utils.retry import RetryPolicy
+from src.huggingface.hf_pipeline import ResultSink
+from src.huggingface.hf_generate import hf_data_generate, load_examples
+from src.huggingface.surrogate import JudgeLog, set_judge_log
+
+from configs.hf_config import LLM_API_KEY, LLM_BASE_URL, LLM_MAX_CONCURRENCY, LLM_ADAPTIVE_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_RPM, LLM_TPM, LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_READ_ONLY, LLM_STRUCTURED_OUTPUT, LLM_JSON_MODE, LLM_RETRY, LLM_HEDGE, JUDGE_BATCH_SIZE, BATCH_TOKEN_BUDGET, RESULT_DIR, RESULT_FORMATS, RESULT_SHARD_SIZE, RESULT_COMPRESSION, DEDUP_ENABLED, DEDUP_THRESHOLD, METRICS_TRACE, METRICS_TRACE_PATH, JUDGE_LOG_PATH, GENERATE_TARGET, GENERATE_RESULT_DIR, GENERATE_SETTINGS, TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+
+os.environ["OPENAI_API_KEY"] = LLM_API_KEY
+os.environ["OPENAI_BASE_URL"] = LLM_BASE_URL
+
+set_metrics(Metrics(trace=METRICS_TRACE))
+set_judge_log(JudgeLog(JUDGE_LOG_PATH) if JUDGE_LOG_PATH else None)
+
+set_llm_client(LLMClient(
+    api_key=LLM_API_KEY,
+    base_url=LLM_BASE_URL,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    adaptive_concurrency=LLM_ADAPTIVE_CONCURRENCY,
+    min_concurrency=LLM_MIN_CONCURRENCY,
+    rpm=LLM_RPM,
+    tpm=LLM_TPM,
+    cache=ResponseCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, read_only=LLM_CACHE_READ_ONLY),
+    structured_output=LLM_STRUCTURED_OUTPUT,
+    json_mode=LLM_JSON_MODE,
+    retry=RetryPolicy(**LLM_RETRY, name="llm"),
+    hedge=LLM_HEDGE
+))
+
+async def main(target, examples_dir):
+    # 以爬取并通过评分的样本作为 few-shot 示例，每次调用轮换不同的示例
+    examples = load_examples(examples_dir) if examples_dir else []
+    logging.info(f"Loaded {len(examples)} few-shot examples from {examples_dir}")
+    # 生成结果单独保存；结果分片每次运行都会重写，近重复索引也只在本次运行内有效（内存中）
+    dedup_index = NearDuplicateIndex(None, threshold=DEDUP_THRESHOLD) if DEDUP_ENABLED else None
+    writer = ShardedResultWriter(os.path.join(GENERATE_RESULT_DIR, "results"), formats=RESULT_FORMATS, shard_size=RESULT_SHARD_SIZE, compression=RESULT_COMPRESSION)
+    with writer:
+        await hf_data_generate(
+            TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT, ResultSink(TASK_DESCRIPTION, writer), target,
+            examples=examples,
+            dedup_index=dedup_index,
+            judge_batch_size=JUDGE_BATCH_SIZE,
+            batch_token_budget=BATCH_TOKEN_BUDGET,
+            **GENERATE_SETTINGS
+        )
+    logging.info(f"✅ {writer.records_written} synthetic samples written to {writer.shards}")
+    logging.info(f"LLM concurrency: {get_llm_client().concurrency.stats()}")
+    logging.info("Run metrics:\n" + get_metrics().summary_table())
+    if METRICS_TRACE:
+        get_metrics().export_trace(METRICS_TRACE_PATH)
+        logging.info(f"Trace written to {METRICS_TRACE_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic samples for the configured task.")
+    parser.add_argument("--target", type=int, default=GENERATE_TARGET, help="Number of samples to write.")
+    parser.add_argument("--examples-dir", default=RESULT_DIR, help="Result shards of a crawl run to draw few-shot examples from; empty for zero-shot.")
+    args = parser.parse_args()
+    asyncio.run(main(args.target, args.examples_dir))
@@ -1,14 +1,25 @@
 import os
-import csv
-import time
 import logging
 import asyncio
-from tqdm import tqdm
-
-from src.utils.hf_client import HFClient
-from src.huggingface.hf_crawl import keyword_extraction, instruction_judge, field_filter, format_conversion, data_generator_few_shot, data_generator_zero_shot
-
-from configs.hf_config import LLM_API_KEY, LLM_BASE_URL, HUGGINGFACE_TOKEN, TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT
+import argparse
+
+from src.utils.hf_client import AsyncHFClient
+from src.utils.llm_client import LLMClient, get_llm_client, set_llm_client
+from src.utils.llm_cache import ResponseCache
+from src.utils.hf_cache import MetadataCache
+from src.utils.journal import RunJournal
+from src.utils.result_store import ShardedResultWriter
+from src.utils.dedup import NearDuplicateIndex
+from src.utils.metrics import Metrics, get_metrics, set_metrics
+from src.utils.retry import RetryPolicy
+from src.utils.speculation import SpeculationPolicy
+from src.utils.budget import SpendBudget
+from src.huggingface.hf_pipeline import hf_data_stream, ResultSink
+from src.huggingface.prefilter import PrefilterCascade, build_prefilter
+from src.huggingface.surrogate import JudgeLog, set_judge_log, load_surrogate
+from src.huggingface.hf_budget import hf_data_budgeted
+
+from configs.hf_config import LLM_API_KEY, LLM_BASE_URL, LLM_MAX_CONCURRENCY, LLM_ADAPTIVE_CONCURRENCY, LLM_MIN_CONCURRENCY, LLM_RPM, LLM_TPM, LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_READ_ONLY, LLM_STRUCTURED_OUTPUT, LLM_JSON_MODE, LLM_RETRY, LLM_HEDGE, HUGGINGFACE_TOKEN, HF_MAX_CONCURRENCY_PER_HOST, HF_RPM_PER_HOST, HF_CACHE_PATH, HF_CACHE_OFFLINE, HF_RETRY, HF_HEDGE, TASK_DATASETS_COUNT, TASK_DATA_SAMPLES, ROW_SAMPLING, DATASET_RANKING, PIPELINE_WORKERS, PIPELINE_QUEUE_SIZE, JUDGE_BATCH_SIZE, CONVERT_BATCH_SIZE, BATCH_TOKEN_BUDGET, JOURNAL_PATH, RESULT_DIR, RESULT_FORMATS, RESULT_SHARD_SIZE, RESULT_COMPRESSION, DEDUP_ENABLED, DEDUP_INDEX_PATH, DEDUP_THRESHOLD, METRICS_TRACE, METRICS_TRACE_PATH, SPECULATION, BUDGET_TARGET_ACCEPTED, BUDGET_MAX_ROWS_PER_DATASET, BUDGET, JUDGE_LOG_PATH, SURROGATE_ENABLED, SURROGATE_SETTINGS, PREFILTER_ENABLED, PREFILTER_SETTINGS, TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,158 +30,99 @@ logging.basicConfig(
 os.environ["OPENAI_API_KEY"] = LLM_API_KEY
 os.environ["OPENAI_BASE_URL"] = LLM_BASE_URL
 
-async def hf_data_crawl(task_description, client, task_datasets_count=5, task_data_samples=5):
-    # 提取任务关键词
-    task_keywords = await keyword_extraction(task_description)
-    logging.info(f"Extracted Task keywords: {task_keywords}")
-
-    # 初始化 Hugging Face 客户端
-    client = HFClient(hf_token=HUGGINGFACE_TOKEN)
-
-    dataset_map = {}
-    for task_keyword in tqdm(task_keywords, desc="🔍 Searching keywords", unit="keyword"):
-        # Hugging Face 搜索数据集
-        task_datasets = client.search_datasets(task_keyword)
-        if not task_datasets:
-            continue
-
-        dataset_map[task_keyword] = []
-        time.sleep(1)
-        
-        for task_dataset in tqdm(task_datasets[:task_datasets_count], desc=f"📦 {task_keyword}", leave=False, unit="dataset"):
-            # 打印数据集基础信息
-            dataset_id = task_dataset.id
-            logging.info(f"Loading dataset: {dataset_id}")
-            dataset_info = client.get_info(dataset_id)
-            logging.info(f"Loaded dataset info for {dataset_id}")
-            dataset_splits = client.get_splits(dataset_id)["splits"]
-            logging.info(f"Available splits for {dataset_id}: {dataset_splits}")
-            first_split = dataset_splits[0]["split"]
-            first_rows = client.get_first_rows(dataset_id, split=first_split)["rows"][:task_data_samples]
-            
-            # 整合所有的待处理样本
-            dataset_map[task_keyword].append({
-                "id": dataset_id,
-                "info": dataset_info,
-                "rows": first_rows
-            })
-            
-    return dataset_map
-            
-async def hf_data_process_sample(row, task_description, input_format, output_format):
-    # 单个样本过滤和处理
-    row_data = row["row"]
-    legal_keys = row_data.keys()
-    
-    # 检查哪些字段对应Input和Output
-    fields = await field_filter(str(row_data), legal_keys)
-    if fields["input"] is None or fields["output"] is None:
-        logging.info("Skipping row due to missing input/output fields.")
-        return None
-    
-    # 获取原始的Input和Output文本
-    input_text = row_data.get(fields["input"])
-    output_text = row_data.get(fields["output"])
-    if input_text is None or output_text is None:
-        logging.info("Skipping row due to None input/output values.")
-        return None
-    
-    original_sample = {
-        "input": input_text,
-        "output": output_text
-    }
-    
-    # 对原始样本进行任务适应性评分，只保留每个分数大于8的
-    sample_scores = await instruction_judge(task_description, str(original_sample))
-    for criteria, score in sample_scores.items():
-        if int(score) < 8:
-            logging.info(f"Skipping row due to low score on {criteria}: {score}")
-            return None
-        
-    # 对照任务要求的标准格式进行转换
-    formatted_sample = await format_conversion(
-        original_sample["input"],
-        original_sample["output"],
-        input_format,
-        output_format
+set_metrics(Metrics(trace=METRICS_TRACE))
+set_judge_log(JudgeLog(JUDGE_LOG_PATH) if JUDGE_LOG_PATH else None)
+
+# 所有 LLM 调用共享同一个连接池和并发/速率限制，并发上限按 429/延迟自适应调整
+set_llm_client(LLMClient(
+    api_key=LLM_API_KEY,
+    base_url=LLM_BASE_URL,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    adaptive_concurrency=LLM_ADAPTIVE_CONCURRENCY,
+    min_concurrency=LLM_MIN_CONCURRENCY,
+    rpm=LLM_RPM,
+    tpm=LLM_TPM,
+    cache=ResponseCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, read_only=LLM_CACHE_READ_ONLY),
+    structured_output=LLM_STRUCTURED_OUTPUT,
+    json_mode=LLM_JSON_MODE,
+    retry=RetryPolicy(**LLM_RETRY, name="llm"),
+    hedge=LLM_HEDGE
+))
+
+async def main(resume=False, budgeted=False):
+    hf_client = AsyncHFClient(
+        hf_token=HUGGINGFACE_TOKEN,
+        max_concurrency_per_host=HF_MAX_CONCURRENCY_PER_HOST,
+        rpm_per_host=HF_RPM_PER_HOST,
+        cache=MetadataCache(HF_CACHE_PATH, offline=HF_CACHE_OFFLINE),
+        retry=RetryPolicy(**HF_RETRY, name="hf"),
+        hedge=HF_HEDGE
     )
-    if formatted_sample.get("input") is None or formatted_sample.get("output") is None:
-        logging.info("Skipping row due to None formatted input/output values.")
-        return None
-    
-    return original_sample, sample_scores, formatted_sample
-
-async def hf_data_process(dataset_map, task_description, input_format, output_format):
-    all_tasks = []
-    index_map = []
-
-    # 打包所有任务
-    for keyword, datasets in dataset_map.items():
-        for dataset in datasets:
-            for row in dataset["rows"]:
-                task = asyncio.create_task(hf_data_process_sample(row, task_description, input_format, output_format))
-                all_tasks.append(task)
-                index_map.append((keyword, dataset["id"], dataset["info"]))
-
-    logging.info(f"🚀 Launching {len(all_tasks)} async sample-processing tasks...")
-
-    # 全部并发执行
-    results = await asyncio.gather(*all_tasks)
-
-    processed_data_map = {}
-    for (keyword, dataset_id, dataset_info), result in zip(index_map, results):
-        if result is None:
-            continue
-        original_sample, sample_scores, formatted_sample = result
-        if keyword not in processed_data_map:
-            processed_data_map[keyword] = []
-        # 查找现有 dataset entry 或新建
-        dataset_entry = next((d for d in processed_data_map[keyword] if d["id"] == dataset_id), None)
-        if not dataset_entry:
-            dataset_entry = {"id": dataset_id, "info": dataset_info, "samples": []}
-            processed_data_map[keyword].append(dataset_entry)
-        dataset_entry["samples"].append({
-            "original_input": original_sample["input"],
-            "original_output": original_sample["output"],
-            "scores": sample_scores,
-            "formatted_input": formatted_sample["input"],
-            "formatted_output": formatted_sample["output"]
-        })
-
-    return processed_data_map
-
-def save_data_csv(dataset_map, task_description):
-    os.makedirs("hf_logs", exist_ok=True)
-    csv_filename = os.path.join("hf_logs", "hf_data_log.csv")
-    with open(csv_filename, mode="w", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        # 写入标题行
-        writer.writerow([
-            "Task_Definition", "Keyword", "Dataset_ID", 
-            "Original_Input", "Original_Output", 
-            "Judge_Scores", 
-            "Formatted_Input", "Formatted_Output"
-        ])
-
-        # 遍历 dataset_map 生成每一行
-        for kw, datasets in dataset_map.items():
-            for dataset in datasets:
-                dataset_id = dataset["id"]
-                for sample in dataset["samples"]:
-                    writer.writerow([
-                        task_description, kw, dataset_id,
-                        sample["original_input"], sample["original_output"],
-                        str(sample["scores"]),
-                        sample["formatted_input"], sample["formatted_output"]
-                    ])
-                    
-    logging.info(f"✅ CSV 文件已生成: {csv_filename}")
+    # 抓取、字段映射、评分、格式转换以流水线方式并发执行，结果流式写入分片的 JSONL/Parquet
+    # 每个阶段的结果写入 journal，--resume 时跳过已完成的工作
+    # 在评分之前用本地规则（长度、语言、黑名单、答案存在）过滤明显不可用的样本
+    # 训练过的本地代理评分模型作为最后一条规则，拒绝明显低分的样本，其余交给 LLM 评分
+    surrogate = load_surrogate(task_description=TASK_DESCRIPTION, **SURROGATE_SETTINGS) if SURROGATE_ENABLED else None
+    if PREFILTER_ENABLED:
+        prefilter = build_prefilter(**PREFILTER_SETTINGS, surrogate=surrogate)
+    else:
+        prefilter = PrefilterCascade([surrogate]) if surrogate is not None else None
+    # 在评分之前按输入文本做精确 + MinHash/LSH 近重复去重；索引与结果分片同属一次运行，仅 --resume 时沿用
+    dedup_index = NearDuplicateIndex(DEDUP_INDEX_PATH, threshold=DEDUP_THRESHOLD, resume=resume) if DEDUP_ENABLED else None
+    writer = ShardedResultWriter(RESULT_DIR, formats=RESULT_FORMATS, shard_size=RESULT_SHARD_SIZE, compression=RESULT_COMPRESSION)
+    speculation = SpeculationPolicy(**SPECULATION) if SPECULATION else None
+    if budgeted:
+        # 按各数据集的通过率分配 LLM 预算，直到得到目标数量的样本或预算耗尽
+        with writer:
+            await hf_data_budgeted(
+                TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT, hf_client, ResultSink(TASK_DESCRIPTION, writer),
+                target_accepted=BUDGET_TARGET_ACCEPTED,
+                budget=SpendBudget(**BUDGET),
+                task_datasets_count=TASK_DATASETS_COUNT,
+                max_rows_per_dataset=BUDGET_MAX_ROWS_PER_DATASET,
+                row_sampling=ROW_SAMPLING,
+                ranking=DATASET_RANKING,
+                prefilter=prefilter,
+                speculation=speculation,
+                dedup_index=dedup_index
+            )
+    else:
+        with writer, RunJournal(JOURNAL_PATH, resume=resume) as journal:
+            sink = ResultSink(TASK_DESCRIPTION, writer)
+            await hf_data_stream(
+                TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT, hf_client, sink,
+                task_datasets_count=TASK_DATASETS_COUNT,
+                task_data_samples=TASK_DATA_SAMPLES,
+                row_sampling=ROW_SAMPLING,
+                ranking=DATASET_RANKING,
+                workers=PIPELINE_WORKERS,
+                queue_size=PIPELINE_QUEUE_SIZE,
+                judge_batch_size=JUDGE_BATCH_SIZE,
+                convert_batch_size=CONVERT_BATCH_SIZE,
+                batch_token_budget=BATCH_TOKEN_BUDGET,
+                journal=journal,
+                dedup_index=dedup_index,
+                prefilter=prefilter,
+                speculation=speculation
+            )
+    await hf_client.aclose()
+    logging.info(f"✅ {writer.records_written} samples written to {writer.shards}")
+    logging.info(f"LLM cache stats: {get_llm_client().cache.stats()}")
+    logging.info(f"HF cache stats: {hf_client.cache.stats()}")
+    logging.info(f"LLM concurrency: {get_llm_client().concurrency.stats()}")
+    # 各阶段延迟分位数、并发峰值、token 用量和通过/拒绝计数
+    logging.info("Run metrics:\n" + get_metrics().summary_table())
+    if METRICS_TRACE:
+        get_metrics().export_trace(METRICS_TRACE_PATH)
+        logging.info(f"Trace written to {METRICS_TRACE_PATH}")
 
 
 if __name__ == "__main__":
-    hf_client = HFClient(hf_token=HUGGINGFACE_TOKEN)
-    dataset_map = asyncio.run(hf_data_crawl(TASK_DESCRIPTION, hf_client))
-    processed_data_map = asyncio.run(
-        hf_data_process(dataset_map, TASK_DESCRIPTION, INPUT_FORMAT, OUTPUT_FORMAT)
-    )
-    save_data_csv(processed_data_map, TASK_DESCRIPTION)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crawl and process Hugging Face datasets for the configured task.")
+    parser.add_argument("--resume", action="store_true", help="Reuse stage results recorded in the journal by a previous run.")
+    parser.add_argument("--budgeted", action="store_true", help="Draw rows adaptively across datasets until BUDGET_TARGET_ACCEPTED samples or the BUDGET is spent.")
+    args = parser.parse_args()
+    if args.resume and args.budgeted:
+        # 预算模式按实时通过率随机抽行，没有可复用的 journal
+        parser.error("--resume is not supported with --budgeted")
+    asyncio.run(main(resume=args.resume, budgeted=args.budgeted))
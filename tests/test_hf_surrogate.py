@@ -0,0 +1,67 @@
+import json
+import logging
+import argparse
+
+from src.huggingface.surrogate import SurrogateJudge, calibration_report, format_report, load_judge_examples, surrogate_path, train_surrogate
+
+from configs.hf_config import JUDGE_LOG_PATH, SURROGATE_SETTINGS, SURROGATE_TRAINING, TASK_DESCRIPTION
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S"
+)
+
+
+def task_descriptions(judge_log_path, tasks=None, all_tasks=False):
+    if tasks:
+        return tasks
+    if not all_tasks:
+        return [TASK_DESCRIPTION]
+    # 判定日志里出现过的所有任务，按出现顺序
+    seen = {}
+    with open(judge_log_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                seen.setdefault(json.loads(line).get("task"), None)
+            except json.JSONDecodeError:
+                continue
+    return [task for task in seen if task]
+
+
+def train(task_description, data_paths, model_dir, min_examples=200, **training):
+    examples = load_judge_examples(data_paths, task_description)
+    path = surrogate_path(model_dir, task_description)
+    if len(examples) < min_examples:
+        logging.warning(f"Only {len(examples)} judged samples for {task_description[:60]!r}, need {min_examples}; not training")
+        return
+    model = train_surrogate(examples, task_description, **training)
+    model.save(path)
+    logging.info(f"✅ Surrogate judge trained on {len(examples)} samples, saved to {path}\n{format_report(model.report)}")
+
+
+def report(task_description, data_paths, model_dir):
+    # 用最新的判定数据检查已有模型是否仍然校准（包括训练之后新增的样本）
+    path = surrogate_path(model_dir, task_description)
+    model = SurrogateJudge.load(path)
+    examples = load_judge_examples(data_paths, task_description)
+    probabilities = [model.predict(sample) for sample, _ in examples]
+    current = calibration_report(probabilities, [accepted for _, accepted in examples], model.threshold)
+    logging.info(f"Surrogate judge {path}\nAt training (held out):\n{format_report(model.report)}\nOn all current data:\n{format_report(current)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train (or refresh) the local surrogate judge from accumulated LLM judge verdicts, or report its calibration.")
+    parser.add_argument("command", choices=["train", "report"])
+    parser.add_argument("--task", action="append", help="Task description to train for (repeatable); defaults to the configured task.")
+    parser.add_argument("--all-tasks", action="store_true", help="Train one model per task found in the judge log.")
+    parser.add_argument("--journal", action="append", default=[], help="RunJournal of a run of the task to use as extra labeled data (repeatable).")
+    parser.add_argument("--model-dir", default=SURROGATE_SETTINGS["model_dir"])
+    args = parser.parse_args()
+
+    data_paths = [JUDGE_LOG_PATH, *args.journal]
+    for task_description in task_descriptions(JUDGE_LOG_PATH, args.task, args.all_tasks):
+        if args.command == "train":
+            train(task_description, data_paths, args.model_dir, **SURROGATE_TRAINING)
+        else:
+            report(task_description, data_paths, args.model_dir)